@@ -0,0 +1,45 @@
+"""
+Compares the original parse_checksum, which split the response with rsplit, with the current one, which uses
+rpartition, on realistic RAPI responses.
+
+    python benchmarks/checksum.py [repeats]
+"""
+import sys
+import timeit
+
+import openevsewifi
+
+RETS = ['$OK 1 0^21', '$OK 2 3^21', '$OK 30 0001^22', '$OK 6 80^1E', '$OK 580 570 -2560^23',
+        '$OK 0 2 19 1 40 47^1C', '$OK 0 136425^17', '$OK 5.0.1 4.0.1^21', '$NK^21', '$OK 10340 -1^0A']
+
+
+def original_parse_checksum(s):
+    spl = s.rsplit('^', 1)
+    if len(spl) == 1:
+        return s
+    try:
+        check = int(spl[1], 16)
+    except ValueError:
+        raise openevsewifi.BadChecksum(s)
+    datsum = 0
+    for c in spl[0].encode('utf-8'):
+        datsum ^= c
+    if datsum != check:
+        raise openevsewifi.BadChecksum(s)
+    return spl[0]
+
+
+def seconds(parse, repeats):
+    return min(timeit.repeat(lambda: [parse(s) for s in RETS], number=repeats, repeat=5))
+
+
+def main(repeats=20000):
+    original = seconds(original_parse_checksum, repeats)
+    current = seconds(openevsewifi.parse_checksum, repeats)
+    per_call = repeats * len(RETS)
+    print('parse_checksum: original %.3f us/call, current %.3f us/call (%.2fx)'
+          % (original / per_call * 1e6, current / per_call * 1e6, original / current))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
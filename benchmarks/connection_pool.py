@@ -0,0 +1,35 @@
+"""
+Compares the request rate of a fresh connection per command (the pre-session behaviour)
+with the persistent session used by Charger, against a simulated wifi module.
+
+    python benchmarks/connection_pool.py [requests]
+"""
+import sys
+import time
+
+import requests
+
+import openevsewifi
+from openevsewifi.simulator import ChargerSimulator
+
+
+def requests_per_second(send, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        send()
+    return count / (time.perf_counter() - start)
+
+
+def main(count=500):
+    with ChargerSimulator() as simulator:
+        url = 'http://' + simulator.host + '/r?json=1&'
+        fresh = requests_per_second(lambda: requests.post(url, data={'rapi': '$GV'}), count)
+        with openevsewifi.Charger(simulator.host, json=True) as charger:
+            pooled = requests_per_second(lambda: charger._send_command('$GV'), count)
+    print('new connection per request: %8.1f req/s' % fresh)
+    print('persistent session:         %8.1f req/s' % pooled)
+    print('speedup:                    %8.2fx' % (pooled / fresh))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
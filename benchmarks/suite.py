@@ -0,0 +1,152 @@
+"""
+Benchmarks the client's hot paths and prints the results as JSON, so they can be compared between releases.
+
+    python benchmarks/suite.py [--quick] [--output results.json]
+
+Network benchmarks run against openevsewifi.simulator on localhost.  The multi-charger benchmark needs the optional
+aiohttp dependency and is reported as skipped without it.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+import openevsewifi
+from checksum import RETS, original_parse_checksum
+from openevsewifi.simulator import ChargerSimulator, SimulatorFleet
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'fixtures')
+
+
+def load_fixtures(version):
+    directory = os.path.join(FIXTURES, version + '_responses')
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name != 'bad_checksum.txt':
+            with open(os.path.join(directory, name), encoding='utf-8') as fptr:
+                pages.append(fptr.read())
+    return pages
+
+
+def per_call(function, items, number):
+    """Returns the best time, in microseconds, of calling function on each of items"""
+    best = min(timeit.repeat(lambda: [function(item) for item in items], number=number, repeat=5))
+    return {'us_per_call': best / (number * len(items)) * 1e6, 'calls': number * len(items)}
+
+
+def latencies(function, count):
+    """Returns latency statistics, in milliseconds, of calling function count times"""
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'count': count,
+        'mean_ms': statistics.mean(samples),
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[int(len(samples) * 0.95) - 1],
+        'max_ms': samples[-1],
+    }
+
+
+def bench_parse_checksum(scale):
+    return {
+        'original': per_call(original_parse_checksum, RETS, 2000 * scale),
+        'current': per_call(openevsewifi.parse_checksum, RETS, 2000 * scale),
+    }
+
+
+def bench_json_parser(scale):
+    return per_call(openevsewifi.json_parser, load_fixtures('v3'), 2000 * scale)
+
+
+def bench_xml_parser(scale):
+    return {
+        'v1': per_call(openevsewifi._XmlParser(), load_fixtures('v1'), 500 * scale),
+        'v2': per_call(openevsewifi._XmlParser(), load_fixtures('v2'), 500 * scale),
+    }
+
+
+def bench_single_property(scale):
+    results = {}
+    with ChargerSimulator() as simulator:
+        for flavour in ('json', 'html'):
+            with openevsewifi.Charger(simulator.host, json=flavour == 'json') as charger:
+                results[flavour] = latencies(lambda: charger.status, 100 * scale)
+    return results
+
+
+def bench_property_sweep(scale):
+    names = openevsewifi.ChargerSnapshot._fields
+    with ChargerSimulator() as simulator, openevsewifi.Charger(simulator.host, json=True) as charger:
+        return {
+            'properties': latencies(lambda: [getattr(charger, name) for name in names], 5 * scale),
+            'snapshot': latencies(charger.snapshot, 5 * scale),
+        }
+
+
+def bench_fleet_throughput(scale, chargers=50, latency=0.02):
+    try:
+        from openevsewifi.fleet import ChargerFleet
+    except ImportError:
+        return {'skipped': 'aiohttp is not installed'}
+
+    async def poll(hosts):
+        async with ChargerFleet.from_hosts(hosts, json=True, concurrency=chargers) as fleet:
+            started = time.perf_counter()
+            results = [result async for result in fleet.poll(['status', 'charging_current', 'usage_session'])]
+            return results, time.perf_counter() - started
+
+    with SimulatorFleet(chargers, latency=latency) as fleet:
+        runs = [asyncio.run(poll(fleet.hosts)) for _ in range(scale)]
+    seconds = min(elapsed for _, elapsed in runs)
+    failures = sum(result.error is not None for results, _ in runs for result in results)
+    return {
+        'chargers': chargers,
+        'simulated_latency_ms': latency * 1000,
+        'seconds': seconds,
+        'chargers_per_second': chargers / seconds,
+        'failures': failures,
+    }
+
+
+BENCHMARKS = [
+    ('parse_checksum', bench_parse_checksum),
+    ('json_parser', bench_json_parser),
+    ('xml_parser', bench_xml_parser),
+    ('single_property', bench_single_property),
+    ('property_sweep', bench_property_sweep),
+    ('fleet_throughput', bench_fleet_throughput),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the openevsewifi client.')
+    parser.add_argument('--quick', action='store_true', help='run fewer iterations')
+    parser.add_argument('--output', help='write the results to this file instead of standard output')
+    args = parser.parse_args(argv)
+    scale = 1 if args.quick else 5
+    report = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmarks': {name: benchmark(scale) for name, benchmark in BENCHMARKS},
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fptr:
+            fptr.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,50 @@
+"""
+Compares the original xml_parser, which searched with uncompiled patterns and fell back to a second scan for v1
+pages, with the precompiled parser a Charger uses, on the v1 and v2 test fixtures.
+
+    python benchmarks/xml_parser.py [repeats]
+"""
+import glob
+import os
+import re
+import sys
+import timeit
+
+import openevsewifi
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'fixtures')
+
+
+def original_xml_parser(s):
+    response = re.search('\\<p>&gt;\\$([^\\^]+)(\\^..)?<script', s)
+    if response is None:
+        response = re.search('\\>\\>\\$(.+)\\<p>', s)
+    return response.group(1).split()
+
+
+def load_pages(version):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, version + '_responses', '*.txt'))):
+        if not path.endswith('bad_checksum.txt'):
+            with open(path, encoding='utf-8') as fptr:
+                pages.append(fptr.read())
+    return pages
+
+
+def seconds(parse, pages, repeats):
+    return min(timeit.repeat(lambda: [parse(page) for page in pages], number=repeats, repeat=5))
+
+
+def main(repeats=2000):
+    for version in ('v1', 'v2'):
+        pages = load_pages(version)
+        original = seconds(original_xml_parser, pages, repeats)
+        parser = openevsewifi._XmlParser()
+        precompiled = seconds(parser, pages, repeats)
+        per_page = repeats * len(pages)
+        print('%s pages: original %.2f us/page, precompiled %.2f us/page (%.2fx)'
+              % (version, original / per_page * 1e6, precompiled / per_page * 1e6, original / precompiled))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -1,12 +1,29 @@
 import re
 import requests
+import requests.adapters
+import asyncio
 import datetime
 import json
+import math
+import random
+import socket
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 from deprecated import deprecated
 from typing import (
+  FrozenSet,
+  Iterable,
+  Iterator,
   List,
-  Optional
+  NamedTuple,
+  Optional,
+  Tuple,
+  Union
 )
 
 
@@ -29,6 +46,263 @@ states = {
 colors = ['off', 'red', 'green', 'yellow', 'blue', 'violet', 'teal', 'white']
 
 
+class StatusRecord(NamedTuple('StatusRecord', [('state', int), ('elapsed', int)])):
+    """The decoded reply to $GS: the EVSE state and the charge time elapsed, in seconds"""
+    __slots__ = ()
+    command = '$GS'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'StatusRecord':
+        return cls(int(response[1]), int(response[2]))
+
+
+class TimeLimitRecord(NamedTuple('TimeLimitRecord', [('minutes', int)])):
+    """The decoded reply to $G3: the time limit in minutes, or 0 if no limit is set"""
+    __slots__ = ()
+    command = '$G3'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'TimeLimitRecord':
+        return cls(int(response[1])*15)
+
+
+class AmmeterRecord(NamedTuple('AmmeterRecord', [('scale_factor', int), ('offset', int)])):
+    """The decoded reply to $GA: the ammeter settings"""
+    __slots__ = ()
+    command = '$GA'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'AmmeterRecord':
+        return cls(int(response[1]), int(response[2]))
+
+
+class CapacityRangeRecord(NamedTuple('CapacityRangeRecord', [('min_amps', int), ('max_amps', int)])):
+    """The decoded reply to $GC: the capacity range, in amps"""
+    __slots__ = ()
+    command = '$GC'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'CapacityRangeRecord':
+        return cls(int(response[1]), int(response[2]))
+
+
+class SettingsRecord(NamedTuple('SettingsRecord', [('current_capacity', int), ('flags', int)])):
+    """The decoded reply to $GE: the current capacity in amps, and the EVSE flags word"""
+    __slots__ = ()
+    command = '$GE'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'SettingsRecord':
+        return cls(int(response[1]), int(response[2], 16))
+
+
+class FaultCountsRecord(NamedTuple('FaultCountsRecord', [('gfi_trips', int), ('no_gnd_trips', int),
+                                                         ('stuck_relay_trips', int)])):
+    """The decoded reply to $GF: the fault trip counters"""
+    __slots__ = ()
+    command = '$GF'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'FaultCountsRecord':
+        return cls(int(response[1]), int(response[2]), int(response[3]))
+
+
+class ChargingRecord(NamedTuple('ChargingRecord', [('current', float), ('voltage', float)])):
+    """The decoded reply to $GG: the charging current in amps and voltage in volts, negative if unavailable"""
+    __slots__ = ()
+    command = '$GG'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'ChargingRecord':
+        return cls(float(response[1])/1000, float(response[2])/1000)
+
+
+class ChargeLimitRecord(NamedTuple('ChargeLimitRecord', [('kwh', int)])):
+    """The decoded reply to $GH: the charge limit in kWh"""
+    __slots__ = ()
+    command = '$GH'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'ChargeLimitRecord':
+        return cls(int(response[1]))
+
+
+class VoltMeterRecord(NamedTuple('VoltMeterRecord', [('scale_factor', int), ('offset', int)])):
+    """The decoded reply to $GM: the voltmeter settings, or zeros if there is no voltmeter"""
+    __slots__ = ()
+    command = '$GM'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'VoltMeterRecord':
+        if response[0] == 'NK':
+            return cls(0, 0)
+        return cls(int(response[1]), int(response[2]))
+
+
+class ThresholdsRecord(NamedTuple('ThresholdsRecord', [('ambient', float), ('ir', float)])):
+    """The decoded reply to $GO: the temperature thresholds in degrees Celcius, or zeros if none are set"""
+    __slots__ = ()
+    command = '$GO'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'ThresholdsRecord':
+        if response[0] == 'NK':
+            return cls(0.0, 0.0)
+        return cls(float(response[1])/10, float(response[2])/10)
+
+
+class TemperaturesRecord(NamedTuple('TemperaturesRecord', [('rtc', float), ('ambient', float), ('ir', float)])):
+    """The decoded reply to $GP: the sensor temperatures in degrees Celcius"""
+    __slots__ = ()
+    command = '$GP'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'TemperaturesRecord':
+        return cls(float(response[1])/10, float(response[2])/10, float(response[3])/10)
+
+
+class ClockRecord(NamedTuple('ClockRecord', [('time', Optional[datetime.datetime])])):
+    """The decoded reply to $GT: the RTC time, or None if the clock is not set"""
+    __slots__ = ()
+    command = '$GT'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'ClockRecord':
+        if response == ['OK', '165', '165', '165', '165', '165', '85']:
+            return cls(None)
+        return cls(datetime.datetime(year=int(response[1])+2000,
+                                     month=int(response[2]),
+                                     day=int(response[3]),
+                                     hour=int(response[4]),
+                                     minute=int(response[5]),
+                                     second=int(response[6])))
+
+
+class UsageRecord(NamedTuple('UsageRecord', [('session', float), ('total', float)])):
+    """The decoded reply to $GU: the energy used by the current session and in total, in Wh"""
+    __slots__ = ()
+    command = '$GU'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'UsageRecord':
+        return cls(float(response[1])/3600, float(response[2]))
+
+
+class VersionRecord(NamedTuple('VersionRecord', [('firmware', str), ('protocol', str)])):
+    """The decoded reply to $GV: the firmware and protocol versions"""
+    __slots__ = ()
+    command = '$GV'
+
+    @classmethod
+    def decode(cls, response: List[str]) -> 'VersionRecord':
+        return cls(response[1], response[2])
+
+
+# The record type each query command is decoded into.
+_records = {record.command: record for record in (
+    StatusRecord, TimeLimitRecord, AmmeterRecord, CapacityRangeRecord, SettingsRecord, FaultCountsRecord,
+    ChargingRecord, ChargeLimitRecord, VoltMeterRecord, ThresholdsRecord, TemperaturesRecord, ClockRecord,
+    UsageRecord, VersionRecord)}
+
+
+# The records that the JSON /status and /config pages of newer wifi firmware can stand in for: the page, the command,
+# the JSON fields the record is built from, and how.  $GV is left to RAPI, as /config reports the protocol as '-'.
+_bulk_records = [
+    ('/status', '$GS', ('state', 'elapsed'), lambda state, elapsed: StatusRecord(int(state), int(elapsed))),
+    ('/status', '$GG', ('amp', 'voltage'), lambda amp, voltage: ChargingRecord(amp / 1000, float(voltage))),
+    ('/status', '$GP', ('temp1', 'temp2', 'temp3'),
+     lambda rtc, ambient, ir: TemperaturesRecord(rtc / 10, ambient / 10, ir / 10)),
+    ('/status', '$GU', ('wattsec', 'watthour'), lambda wattsec, watthour: UsageRecord(wattsec / 3600, float(watthour))),
+    ('/status', '$GF', ('gfcicount', 'nogndcount', 'stuckcount'),
+     lambda gfci, nognd, stuck: FaultCountsRecord(int(gfci), int(nognd), int(stuck))),
+    ('/config', '$GA', ('scale', 'offset'), lambda scale, offset: AmmeterRecord(int(scale), int(offset))),
+    ('/config', '$GC', ('min_current_hard', 'max_current_hard'),
+     lambda low, high: CapacityRangeRecord(int(low), int(high))),
+]
+
+
+# Every Charger property included in a snapshot, with the RAPI command it is read from and its type.
+_snapshot_fields = [
+    ('status', '$GS', str),
+    ('charge_time_elapsed', '$GS', int),
+    ('time_limit', '$G3', int),
+    ('ammeter_scale_factor', '$GA', int),
+    ('ammeter_offset', '$GA', int),
+    ('min_amps', '$GC', int),
+    ('max_amps', '$GC', int),
+    ('current_capacity', '$GE', int),
+    ('service_level', '$GE', int),
+    ('diode_check_enabled', '$GE', bool),
+    ('vent_required_enabled', '$GE', bool),
+    ('ground_check_enabled', '$GE', bool),
+    ('stuck_relay_check_enabled', '$GE', bool),
+    ('auto_service_level_enabled', '$GE', bool),
+    ('auto_start_enabled', '$GE', bool),
+    ('serial_debug_enabled', '$GE', bool),
+    ('lcd_type', '$GE', str),
+    ('gfi_self_test_enabled', '$GE', bool),
+    ('gfi_trip_count', '$GF', int),
+    ('no_gnd_trip_count', '$GF', int),
+    ('stuck_relay_trip_count', '$GF', int),
+    ('charging_current', '$GG', float),
+    ('charging_voltage', '$GG', float),
+    ('charge_limit', '$GH', int),
+    ('volt_meter_scale_factor', '$GM', int),
+    ('volt_meter_offset', '$GM', int),
+    ('ambient_threshold', '$GO', float),
+    ('ir_threshold', '$GO', float),
+    ('rtc_temperature', '$GP', float),
+    ('ambient_temperature', '$GP', float),
+    ('ir_temperature', '$GP', float),
+    ('time', '$GT', Optional[datetime.datetime]),
+    ('usage_session', '$GU', float),
+    ('usage_total', '$GU', float),
+    ('firmware_version', '$GV', str),
+    ('protocol_version', '$GV', str),
+]
+
+_property_commands = {name: command for name, command, _ in _snapshot_fields}
+
+ChargerSnapshot = NamedTuple('ChargerSnapshot', [(name, kind) for name, _, kind in _snapshot_fields])
+ChargerSnapshot.__doc__ = """An immutable copy of every Charger property, as returned by Charger.snapshot()"""
+
+TelemetrySample = NamedTuple('TelemetrySample', [('timestamp', float), ('status', str), ('charging_current', float),
+                                                 ('charging_voltage', float), ('usage_session', float),
+                                                 ('usage_total', float), ('rtc_temperature', float),
+                                                 ('ambient_temperature', float), ('ir_temperature', float)])
+TelemetrySample.__doc__ = """One reading of the charger's live values, yielded by Charger.telemetry().  timestamp is in
+seconds since the epoch, as returned by time.time()"""
+
+# The RAPI commands read for every telemetry sample.
+_telemetry_commands = ('$GS', '$GG', '$GU', '$GP')
+
+# Charger states in which nothing changes quickly, so telemetry is polled at the idle interval.
+_idle_states = ('not connected', 'sleeping', 'disabled')
+
+
+def _telemetry_interval(status: str, charging_interval: float, interval: float, idle_interval: float) -> float:
+    if status == 'charging':
+        return charging_interval
+    if status in _idle_states:
+        return idle_interval
+    return interval
+
+
+CommandResult = NamedTuple('CommandResult', [('command', str), ('response', Optional[List[str]]),
+                                             ('error', Optional[Exception])])
+CommandResult.__doc__ = """The outcome of one command sent by Charger.batch(): the parsed response, or the exception
+raised while sending it"""
+
+Capabilities = NamedTuple('Capabilities', [('firmware_version', str), ('protocol_version', str), ('flavour', str),
+                                           ('bulk', bool), ('unsupported', FrozenSet[str])])
+Capabilities.__doc__ = """What a charger supports, as found by Charger.probe(): its versions, whether it answers RAPI
+in 'json' or 'html' ('serial' for a SerialCharger), whether it serves the JSON /status and /config pages, and the
+query commands it answers with NK"""
+
+# Query commands that chargers without the optional hardware answer with NK, and whose records decode NK to defaults.
+_optional_commands = ('$GM', '$GO')
+
+
 class BadChecksum(Exception):
     pass
 
@@ -41,6 +315,145 @@ class InvalidAuthentication(Exception):
     pass
 
 
+class CommandRejected(Exception):
+    """Raised when the charger answers a command with NK"""
+    pass
+
+
+class ServerError(BadResponse):
+    """Raised when the wifi module answers with an HTTP 5xx status"""
+    pass
+
+
+class ChargerOffline(Exception):
+    """Raised without contacting the charger while its circuit breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    """Tracks consecutive failures talking to a charger, and fails fast once the charger looks offline.
+
+    After failure_threshold consecutive failures the breaker opens, and requests raise ChargerOffline.  Once
+    reset_timeout seconds have passed a single trial request is let through, and the others keep raising
+    ChargerOffline until it completes: success closes the breaker again, failure keeps it open for another
+    reset_timeout.  A trial that never reports back, because it failed with an error that says nothing about the
+    charger, is given up after reset_timeout, and another let through.  Safe to share between threads."""
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._clock = clock
+        self._opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Returns 'closed', 'open' or 'half-open'"""
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_request(self) -> None:
+        """Raises ChargerOffline if requests should not be sent"""
+        with self._lock:
+            state = self.state
+            if state == 'open':
+                raise ChargerOffline
+            if state == 'half-open':
+                now = self._clock()
+                if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                    raise ChargerOffline
+                self._trial_started = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._trial_started = None
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+
+class ResponseCache:
+    """A bounded cache of decoded RAPI responses, each kept for a time to live that depends on the command.
+
+    ttls maps a command (such as '$GV') to the number of seconds its response stays fresh, and is merged over
+    default_ttls.  Commands without a ttl are never cached.  When more than max_size responses are held, the least
+    recently used one is dropped.  hits and misses count lookups of cacheable commands.  Safe to share between
+    threads, and between chargers: responses are kept by host as well as command, so size max_size for all of
+    them."""
+    default_ttls = {
+        '$GV': 3600,
+        '$GC': 3600,
+        '$GA': 3600,
+        '$GM': 3600,
+        '$GO': 3600,
+        '$GE': 60,
+        '$G3': 10,
+        '$GH': 10,
+        '$GF': 5,
+        '$GP': 5,
+        '$GS': 1,
+        '$GG': 1,
+        '$GU': 1,
+        '$GT': 1,
+    }
+
+    def __init__(self, ttls: dict = None, max_size: int = 32, clock=time.monotonic):
+        self.ttls = dict(self.default_ttls)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, command: str, host: str = None) -> Optional[tuple]:
+        """Returns the cached response of host to command, or None if it is missing or stale"""
+        if not self.ttls.get(command):
+            return None
+        key = (host, command)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, command: str, response: tuple, host: str = None) -> None:
+        """Stores the response of host to command, if the command is cacheable"""
+        ttl = self.ttls.get(command)
+        if not ttl:
+            return
+        key = (host, command)
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, command: str = None, host: str = None) -> None:
+        """Drops the cached responses to command, or to every command if none is given, from host, or from every
+        host if none is given"""
+        with self._lock:
+            for key in [key for key in self._entries
+                        if (command is None or key[1] == command) and (host is None or key[0] == host)]:
+                del self._entries[key]
+
+
 def parse_checksum(s):
     """
     If there is a '^' in given string s, this checks that the xor of utf8 bytes
@@ -49,19 +462,19 @@ def parse_checksum(s):
 
     If there is no '^' in the string, the string is returned.
     """
-    spl = s.rsplit('^', 1)
-    if len(spl) == 1:
+    data, sep, checksum = s.rpartition('^')
+    if not sep:
         return s
     try:
-        check = int(spl[1], 16)
+        check = int(checksum, 16)
     except ValueError:
         raise BadChecksum(s)
     datsum = 0
-    for c in spl[0].encode('utf-8'):
+    for c in data.encode('utf-8'):
         datsum ^= c
     if datsum != check:
         raise BadChecksum(s)
-    return spl[0]
+    return data
 
 
 def json_parser(s):
@@ -83,38 +496,746 @@ def json_parser(s):
     return parsed.split()
 
 
+# The RAPI response in the HTML pages of the v2 and v1 wifi firmware, in the order they are tried.  v1 pages:
+# https://github.com/OpenEVSE/ESP8266_WiFi_v1.x/blob/master/OpenEVSE_RAPI_WiFi_ESP8266.ino#L357
+_xml_patterns = (
+    re.compile('<p>&gt;(\\$[^^]+(?:\\^..)?)<script'),
+    re.compile('>>(\\$.+)<p>'),
+)
+
+
+def _xml_response(match) -> List[str]:
+    # for compatibility with json_parser, strip off the leading $.
+    return parse_checksum(match.group(1))[1:].split()
+
+
 def xml_parser(s):
-    response = re.search('\\<p>&gt;\\$([^\\^]+)(\\^..)?<script', s)
-    # If we are using version 1
-    # https://github.com/OpenEVSE/ESP8266_WiFi_v1.x/blob/master/OpenEVSE_RAPI_WiFi_ESP8266.ino#L357
-    if response is None:
-        response = re.search('\\>\\>\\$(.+)\\<p>', s)
-    return response.group(1).split()
+    """
+    Parses the HTML page returned by v1 and v2 wifi firmware and checks the
+    checksum of the response, when there is one.
+
+    Throws openevsewifi.BadChecksum if the checksum is invalid, and
+    openevsewifi.BadResponse if the page contains no response.
+    """
+    for pattern in _xml_patterns:
+        match = pattern.search(s)
+        if match is not None:
+            return _xml_response(match)
+    raise BadResponse(s)
+
+
+class _XmlParser:
+    """Parses HTML pages like xml_parser, but only tries the page format the charger answered with last time"""
+    def __init__(self):
+        self._pattern = None
+
+    def __call__(self, s: str) -> List[str]:
+        if self._pattern is not None:
+            match = self._pattern.search(s)
+            if match is not None:
+                return _xml_response(match)
+        for pattern in _xml_patterns:
+            match = pattern.search(s)
+            if match is not None:
+                self._pattern = pattern
+                return _xml_response(match)
+        raise BadResponse(s)
+
+
+class Instrumentation:
+    """Receives timings and errors for every RAPI request a charger sends.  Subclass it and override the methods of
+    interest; openevsewifi.metrics.MetricsCollector is a ready-made implementation.
+
+    Commands are reported by name only, such as '$SC', without their arguments."""
+    def on_response(self, host: str, command: str, network_seconds: float, parse_seconds: float) -> None:
+        """Called after a response is received and parsed, with the time spent on each"""
+        pass
+
+    def on_error(self, host: str, command: str, error: Exception) -> None:
+        """Called when a request fails, including each failed attempt that is retried"""
+        pass
+
+
+def _command_name(command: str) -> str:
+    return command.split(' ', 1)[0]
+
+
+# The records that can be built from pushed values: the command, the JSON fields it needs, and how to build it.
+_pushed_records = {command: (fields, build) for page, command, fields, build in _bulk_records if page == '/status'}
+
+
+class PushState:
+    """The values a charger has pushed, over its websocket or MQTT, merged as they arrive.  The values are only used
+    while connected is true.  updates counts the messages received.  Safe to read from any thread."""
+    def __init__(self):
+        self.values = {}
+        self.connected = False
+        self.updates = 0
+        self._condition = threading.Condition()
+
+    def update(self, values: dict) -> None:
+        with self._condition:
+            self.values.update(values)
+            self.updates += 1
+            self._condition.notify_all()
+
+    def set_connected(self, connected: bool) -> None:
+        with self._condition:
+            self.connected = connected
+            self._condition.notify_all()
+
+    def record(self, command: str) -> Optional[tuple]:
+        """Returns the record for command built from the pushed values, or None if the websocket is disconnected or
+        has not pushed the values it needs"""
+        if command not in _pushed_records:
+            return None
+        fields, build = _pushed_records[command]
+        with self._condition:
+            if not self.connected:
+                return None
+            try:
+                return build(*(self.values[field] for field in fields))
+            except (KeyError, TypeError, ValueError):
+                return None
+
+    def wait(self, updates: int, timeout: float = None) -> bool:
+        """Blocks until at least updates messages have been received, and returns False if timeout seconds pass
+        first"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.updates >= updates, timeout)
+
+
+def _wake(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class RequestLimiter:
+    def __init__(self, max_in_flight: int = 1, rate: float = None, burst: int = 1, clock=time.monotonic):
+        """Limits the requests made to one charger to max_in_flight at a time and, if rate is given, to rate per
+        second on average, in bursts of at most burst.
+
+        Use acquire() and release(), or the limiter as a context manager, from threads, and acquire_async() and
+        release() from coroutines.  One limiter can be shared by threads and event loops at the same time."""
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._waiters = []
+
+    def _take(self) -> Optional[float]:
+        """Takes a slot and a token if both are free.  Otherwise returns how long to wait for a token, or inf to wait
+        for a slot to be released."""
+        if self._in_flight >= self.max_in_flight:
+            return math.inf
+        if self.rate is not None:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        self._in_flight += 1
+        return None
+
+    def acquire(self) -> None:
+        """Blocks until a request may be made"""
+        with self._condition:
+            wait = self._take()
+            while wait is not None:
+                self._condition.wait(None if wait == math.inf else wait)
+                wait = self._take()
+
+    async def acquire_async(self) -> None:
+        """Waits, without blocking the event loop, until a request may be made"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                wait = self._take()
+                if wait is None:
+                    return
+                if wait == math.inf:
+                    waiter = (loop, loop.create_future())
+                    self._waiters.append(waiter)
+            if wait == math.inf:
+                try:
+                    await waiter[1]
+                finally:
+                    # A cancelled waiter must not be woken on its loop, which may have closed by then.
+                    with self._condition:
+                        if waiter in self._waiters:
+                            self._waiters.remove(waiter)
+            else:
+                await asyncio.sleep(wait)
+
+    def release(self) -> None:
+        """Marks a request as finished"""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+            waiters = self._waiters
+            self._waiters = []
+        for loop, future in waiters:
+            if loop.is_closed() or future.done():
+                continue
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The loop closed after the check above.
+                pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class _HostTransport:
+    """The connection pool and resolved address shared by every Charger talking to one host"""
+    def __init__(self, host: str, max_connections: int, dns_ttl: float, limiter: RequestLimiter,
+                 clock=time.monotonic):
+        self.host = host
+        self.limiter = limiter
+        self.session = requests.Session()
+        # pool_block makes requests wait for a free connection rather than open more than max_connections.
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_connections,
+                                                                    pool_block=True))
+        split = urlsplit('http://' + host)
+        self._hostname = split.hostname
+        self._port = split.port
+        self._dns_ttl = dns_ttl
+        self._clock = clock
+        self._address = None
+        self._resolved_at = None
+        self._lock = threading.Lock()
+
+    def address(self) -> str:
+        """Returns the host's IP address and port, resolving it at most once every dns_ttl seconds.  If it cannot
+        be resolved the host is returned unchanged, and the request fails as it would have without the cache."""
+        with self._lock:
+            if self._resolved_at is None or self._clock() - self._resolved_at >= self._dns_ttl:
+                try:
+                    address = socket.getaddrinfo(self._hostname, self._port or 80, 0, socket.SOCK_STREAM)[0][4][0]
+                except (socket.gaierror, UnicodeError):
+                    return self.host
+                if ':' in address:
+                    address = '[' + address + ']'
+                self._address = address if self._port is None else address + ':' + str(self._port)
+                self._resolved_at = self._clock()
+            return self._address
+
+    def request(self, method: str, path: str, data: Optional[dict], headers: dict, auth: Optional[Tuple[str, str]],
+                timeout: Union[float, Tuple[float, float]]) -> requests.Response:
+        headers = dict(headers, Host=self.host)
+        return self.session.request(method, 'http://' + self.address() + path, data=data, headers=headers, auth=auth,
+                                    timeout=timeout)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class TransportRegistry:
+    """Connection pools and DNS resolutions shared by every Charger created with shared_transport=True, one per host.
+
+    Each host gets at most max_connections requests in flight at a time, across all the chargers using it, and if
+    rate is given at most rate requests per second in bursts of at most burst; further requests wait their turn.
+    Use limit() to change that for one host before its first request.  Resolved addresses are reused for dns_ttl
+    seconds."""
+    def __init__(self, max_connections: int = 1, dns_ttl: float = 300, rate: float = None, burst: int = 1):
+        self.max_connections = max_connections
+        self.dns_ttl = dns_ttl
+        self.rate = rate
+        self.burst = burst
+        self._limits = {}
+        self._limiters = {}
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def limit(self, host: str, max_connections: int, rate: float = None, burst: int = 1) -> None:
+        """Sets the number of connections and the request rate allowed to host"""
+        with self._lock:
+            self._limits[host] = (max_connections, rate, burst)
+
+    def _limiter(self, host: str) -> RequestLimiter:
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            max_connections, rate, burst = self._limits.get(host, (self.max_connections, self.rate, self.burst))
+            limiter = RequestLimiter(max_connections, rate, burst)
+            self._limiters[host] = limiter
+        return limiter
+
+    def limiter(self, host: str) -> RequestLimiter:
+        """Returns the request limiter for host, to share it with an AsyncCharger"""
+        with self._lock:
+            return self._limiter(host)
+
+    def get(self, host: str) -> _HostTransport:
+        """Returns the transport for host, creating it on first use"""
+        with self._lock:
+            transport = self._transports.get(host)
+            if transport is None:
+                limiter = self._limiter(host)
+                transport = _HostTransport(host, limiter.max_in_flight, self.dns_ttl, limiter)
+                self._transports[host] = transport
+            return transport
+
+    def close(self) -> None:
+        """Closes every shared connection.  Transports are recreated if chargers keep using them."""
+        with self._lock:
+            transports = list(self._transports.values())
+            self._transports.clear()
+        for transport in transports:
+            transport.close()
+
+
+# The registry used by chargers created with shared_transport=True.
+shared_transports = TransportRegistry()
+
+
+# For each setter command, the key under which deferred commands replace each other, and the query whose cached
+# response it makes stale.
+_setter_commands = {
+    '$SC': ('$SC', '$GE'),
+    '$FE': ('power', '$GS'),
+    '$FD': ('power', '$GS'),
+    '$FS': ('power', '$GS'),
+    '$S3': ('$S3', '$G3'),
+    '$SH': ('$SH', '$GH'),
+    '$S1': ('$S1', '$GT'),
+}
+
+
+# Failures worth retrying, and counted by the circuit breaker.
+_transient_errors = (requests.Timeout, requests.ConnectionError, BadChecksum, ServerError)
 
 
 class Charger:
-    def __init__(self, host: str, json: bool = False, username: str = None, password: str = None):
-        """A connection to an OpenEVSE charging station equipped with the wifi kit."""
+    # The errors that are retried, and count as failures for the circuit breaker.
+    _transient_errors = _transient_errors
+
+    def __init__(self, host: str, json: bool = False, username: str = None, password: str = None,
+                 pool_size: int = 1, keep_alive: bool = True, cache: ResponseCache = None,
+                 timeout: Union[float, Tuple[float, float]] = (5, 10), retries: int = 0, backoff: float = 0.5,
+                 max_backoff: float = 8, breaker: CircuitBreaker = None, instrumentation: Instrumentation = None,
+                 shared_transport: bool = False, limiter: RequestLimiter = None, workers: int = 1,
+                 bulk: Optional[bool] = None):
+        """A connection to an OpenEVSE charging station equipped with the wifi kit.
+
+        Requests are sent through a persistent HTTP session, so consecutive commands reuse the same connection to
+        the wifi module.  pool_size limits the number of connections kept open to the charger, and keep_alive=False
+        asks the charger to close the connection after every request.  Call close(), or use the charger as a context
+        manager, to release the connections.
+
+        Passing a ResponseCache reuses recent responses instead of sending the same command again.
+
+        timeout is either one number of seconds or a (connect, read) tuple.  Timeouts, connection errors, bad
+        checksums and 5xx responses are retried up to retries times, sleeping a random time of up to
+        backoff * 2 ** attempt seconds (capped at max_backoff) before each retry.  A CircuitBreaker makes requests
+        raise ChargerOffline straight away while the charger keeps failing.
+
+        An Instrumentation is told the network and parse time of every request, and every error.
+
+        With shared_transport=True the charger uses the connection pool and cached DNS resolution that
+        openevsewifi.shared_transports keeps for its host, shared with every other Charger for the same host.
+        pool_size is then ignored in favour of the registry's per-host limit, and close() leaves the pool open.
+
+        Requests wait for a RequestLimiter before they are sent: the one given, the registry's one for the host with
+        shared_transport=True, or else one allowing pool_size requests in flight at a time.  Share a limiter between
+        chargers, or with an AsyncCharger, to protect a charger from all of them at once.
+
+        A Charger, its cache, breaker and limiter are safe to use from several threads at once.  With workers > 1,
+        snapshot() and read() send their distinct commands concurrently from a pool of that many threads; they are
+        still held to the limiter, so raise pool_size, or the per-host limit, to match.
+
+        Newer wifi firmware serves most of the charger's live values, and its versions, as JSON at /status and
+        /config.  snapshot(), read() and the other multi-property reads use those pages when the charger has them,
+        and send RAPI commands only for the values the pages lack.  The pages show what the wifi module last read
+        from the charger, so they can lag by a few seconds.  By default the pages are only tried with json=True, as
+        the older firmware answering in HTML has none, and never again if the charger turns out not to have them.
+        bulk=False never uses them, and bulk=True tries them whatever the flavour."""
+        self._host = host
+        self._use_flavour(json)
+        self._username = username
+        self._password = password
+        self._auth = (username, password) if username and password else None
+        self._headers = {} if keep_alive else {'Connection': 'close'}
+        if shared_transport:
+            self._transport = shared_transports.get(host)
+            self._session = self._transport.session
+            self._limiter = limiter or self._transport.limiter
+        else:
+            self._transport = None
+            self._session = requests.Session()
+            self._session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+            self._limiter = limiter or RequestLimiter(pool_size)
+        self._cache = cache
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._breaker = breaker
+        self._instrumentation = instrumentation
+        self._pending = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._bulk = bulk if bulk is not None or json else False
+        self._unsupported = set()
+        self._capabilities = None
+        self._probe_lock = threading.Lock()
+
+    def _use_flavour(self, json: bool) -> None:
         if json:
-            self._url = 'http://' + host + '/r?json=1&'
+            self._path = '/r?json=1&'
             self._parseResult = json_parser
         else:
-            self._url = 'http://' + host + '/r?'
-            self._parseResult = xml_parser
-        self._username = username
-        self._password = password
+            self._path = '/r?'
+            self._parseResult = _XmlParser()
+        self._url = 'http://' + self._host + self._path
+
+    def _flavour(self) -> str:
+        return 'json' if self._parseResult is json_parser else 'html'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """Closes any connections held open to the charger, unless they are shared with other chargers"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        if self._transport is None:
+            self._session.close()
+
+    def _query(self, command: str) -> tuple:
+        """Sends a query command and decodes the response into its record"""
+        if self._cache is not None:
+            record = self._cache.get(command, self._host)
+            if record is not None:
+                return record
+        return self._fetch(command)
+
+    def _fetch(self, command: str) -> tuple:
+        return self._decode(command, None if command in self._unsupported else self._send_command(command))
+
+    def _decode(self, command: str, response: Optional[List[str]]) -> tuple:
+        """Decodes the response to a query command, or the default record of an unsupported command if the response
+        is None, and caches it"""
+        if response is None:
+            record = _records[command].decode(['NK'])
+        else:
+            if response[0] == 'NK' and command in _optional_commands:
+                # The answer will not change, so stop asking.
+                self._unsupported.add(command)
+            record = _records[command].decode(response)
+        if self._cache is not None:
+            self._cache.put(command, record, self._host)
+        return record
+
+    def probe(self, refresh: bool = False) -> Capabilities:
+        """Finds out what the charger supports, the first time it is called or with refresh=True, and returns it.
+
+        If the charger does not answer RAPI in the flavour it was created with, the other flavour is tried and kept.
+        Optional commands the charger answers with NK, here or in any later read, are not sent again: properties
+        read from them return their defaults straight away.  refresh=True asks again."""
+        with self._probe_lock:
+            if self._capabilities is not None and not refresh:
+                return self._capabilities
+            if refresh:
+                self._unsupported.clear()
+            try:
+                version = self._fetch('$GV')
+            except ServerError:
+                raise
+            except (BadResponse, ValueError):
+                # JSON or HTML the other parser cannot read.
+                was_json = self._parseResult is json_parser
+                bulk = self._bulk
+                self._use_flavour(not was_json)
+                if was_json and self._bulk is None:
+                    self._bulk = False
+                try:
+                    version = self._fetch('$GV')
+                except Exception:
+                    # Neither flavour works; keep the one the charger was created with.
+                    self._use_flavour(was_json)
+                    self._bulk = bulk
+                    raise
+            for command in _optional_commands:
+                self._fetch(command)
+            if self._bulk is None:
+                self._bulk_query([command for _, command, _, _ in _bulk_records])
+            self._capabilities = Capabilities(version.firmware, version.protocol, self._flavour(),
+                                              bool(self._bulk), frozenset(self._unsupported))
+            return self._capabilities
+
+    def _query_many(self, commands: Iterable[str]) -> dict:
+        """Reads each distinct query command once, from the cache, the bulk JSON pages or RAPI, and returns the
+        decoded records by command.  RAPI commands are sent concurrently if the charger has workers."""
+        commands = list(OrderedDict.fromkeys(commands))
+        records = {}
+        if self._cache is not None:
+            for command in commands:
+                record = self._cache.get(command, self._host)
+                if record is not None:
+                    records[command] = record
+        bulk = self._bulk_query([command for command in commands if command not in records])
+        for command, record in bulk.items():
+            records[command] = record
+            if self._cache is not None:
+                self._cache.put(command, record, self._host)
+        records.update(self._fetch_many([command for command in commands if command not in records]))
+        return {command: records[command] for command in commands}
+
+    def _fetch_many(self, commands: List[str]) -> dict:
+        if self._workers <= 1 or len(commands) <= 1:
+            return {command: self._fetch(command) for command in commands}
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._workers, thread_name_prefix='openevsewifi')
+            executor = self._executor
+        return dict(zip(commands, executor.map(self._fetch, commands)))
+
+    def _bulk_query(self, commands: List[str]) -> dict:
+        """Builds the records for as many of commands as the JSON /status and /config pages cover, and returns them
+        by command.  Returns nothing if the charger does not have the pages."""
+        records = {}
+        if self._bulk is False:
+            return records
+        for path in ('/status', '/config'):
+            wanted = [(command, fields, build) for page, command, fields, build in _bulk_records
+                      if page == path and command in commands]
+            if not wanted:
+                continue
+            self._before_request(path)
+            try:
+                values = self._get_json(path)
+            except (requests.RequestException, ServerError) as error:
+                if self._breaker is not None and isinstance(error, self._transient_errors):
+                    self._breaker.record_failure()
+                # Leave it to the RAPI commands to retry or report the failure.
+                return records
+            if self._breaker is not None:
+                self._breaker.record_success()
+            if values is None:
+                if not self._bulk:
+                    self._bulk = False
+                    return records
+                continue
+            self._bulk = True
+            for command, fields, build in wanted:
+                try:
+                    records[command] = build(*(values[field] for field in fields))
+                except (KeyError, TypeError, ValueError):
+                    pass
+        return records
+
+    def _get_json(self, path: str) -> Optional[dict]:
+        """Returns the JSON object served at path, or None if the charger does not serve one there"""
+        started = time.perf_counter()
+        try:
+            with self._limiter:
+                if self._transport is not None:
+                    content = self._transport.request('GET', path, None, self._headers, self._auth, self._timeout)
+                else:
+                    content = self._session.get('http://' + self._host + path, headers=self._headers,
+                                                auth=self._auth, timeout=self._timeout)
+            received = time.perf_counter()
+            if content.status_code == 401:
+                raise InvalidAuthentication
+            if content.status_code >= 500:
+                raise ServerError(content.status_code)
+        except Exception as error:
+            if self._instrumentation is not None:
+                self._instrumentation.on_error(self._host, path, error)
+            raise
+        try:
+            values = content.json() if content.status_code == 200 else None
+        except ValueError:
+            values = None
+        if self._instrumentation is not None:
+            self._instrumentation.on_response(self._host, path, received - started, time.perf_counter() - received)
+        return values if isinstance(values, dict) else None
+
+    def _before_request(self, name: str) -> None:
+        """Raises ChargerOffline if the circuit breaker is open"""
+        if self._breaker is not None:
+            try:
+                self._breaker.before_request()
+            except ChargerOffline as error:
+                if self._instrumentation is not None:
+                    self._instrumentation.on_error(self._host, name, error)
+                raise
 
     def _send_command(self, command: str) -> List[str]:
         """Sends a command through the web interface of the charger and parses the response"""
+        self._before_request(_command_name(command))
+        try:
+            response = self._send_with_retries(command)
+        except self._transient_errors:
+            if self._breaker is not None:
+                self._breaker.record_failure()
+            raise
+        if self._breaker is not None:
+            self._breaker.record_success()
+        return response
+
+    def _send_with_retries(self, command: str) -> List[str]:
+        attempt = 0
+        while True:
+            try:
+                with self._limiter:
+                    return self._post(command)
+            except self._transient_errors:
+                if attempt >= self._retries:
+                    raise
+            time.sleep(random.uniform(0, min(self._max_backoff, self._backoff * 2 ** attempt)))
+            attempt += 1
+
+    def _post(self, command: str) -> List[str]:
+        if self._instrumentation is None:
+            return self._check_and_parse(self._request(command))
+        try:
+            started = time.perf_counter()
+            content = self._request(command)
+            received = time.perf_counter()
+            response = self._check_and_parse(content)
+        except Exception as error:
+            self._instrumentation.on_error(self._host, _command_name(command), error)
+            raise
+        self._instrumentation.on_response(self._host, _command_name(command), received - started,
+                                          time.perf_counter() - received)
+        return response
+
+    def _request(self, command: str) -> requests.Response:
         data = {'rapi': command}
-        if self._username and self._password:
-            content = requests.post(self._url, data=data, auth=(self._username, self._password))
-        else:
-            content = requests.post(self._url, data=data)
+        if self._transport is not None:
+            return self._transport.request('POST', self._path, data, self._headers, self._auth, self._timeout)
+        return self._session.post(self._url, data=data, headers=self._headers, auth=self._auth, timeout=self._timeout)
+
+    def _check_and_parse(self, content: requests.Response) -> List[str]:
         if content.status_code == 401:
             raise InvalidAuthentication
-        else:
-            return self._parseResult(content.text)
+        if content.status_code >= 500:
+            raise ServerError(content.status_code)
+        return self._parseResult(content.text)
+
+    def batch(self, commands: Iterable[str]) -> List[CommandResult]:
+        """Sends several RAPI commands back to back over the charger's persistent connection, and returns a
+        CommandResult for each, in order.  A command that fails does not stop the ones after it.  Setter commands
+        clear the cached responses they change, as the setters do."""
+        results = []
+        for command in commands:
+            try:
+                results.append(CommandResult(command, self._send_command(command), None))
+            except Exception as error:
+                results.append(CommandResult(command, None, error))
+            finally:
+                self._invalidate_for(command)
+        return results
+
+    def _invalidate_for(self, command: str) -> None:
+        """Drops the cached response that a setter command changes"""
+        setter = _setter_commands.get(_command_name(command))
+        if setter is not None and self._cache is not None:
+            self._cache.invalidate(setter[1], self._host)
+
+    def _set(self, command: str, defer: bool) -> None:
+        key, _ = _setter_commands[_command_name(command)]
+        if defer:
+            with self._pending_lock:
+                self._pending.pop(key, None)
+                self._pending[key] = command
+            return
+        response = self._send_command(command)
+        self._invalidate_for(command)
+        if response[0] != 'OK':
+            raise CommandRejected(command)
+
+    def flush(self) -> List[CommandResult]:
+        """Sends the commands deferred by the setters, and returns a CommandResult for each.  Only the latest value
+        deferred for each setting is sent, and enable(), disable() and sleep() replace each other."""
+        with self._pending_lock:
+            commands = list(self._pending.values())
+            self._pending.clear()
+        results = []
+        for command in commands:
+            try:
+                self._set(command, False)
+                results.append(CommandResult(command, ['OK'], None))
+            except Exception as error:
+                results.append(CommandResult(command, None, error))
+        return results
+
+    def set_current_capacity(self, amps: int, defer: bool = False) -> None:
+        """Sets the current capacity, in amps.  With defer=True the command is queued until flush() is called, and
+        replaces any capacity queued before it.  The other setters take defer in the same way.  Raises
+        CommandRejected if the charger refuses the value."""
+        self._set('$SC %d' % amps, defer)
+
+    def enable(self, defer: bool = False) -> None:
+        """Enables the charger"""
+        self._set('$FE', defer)
+
+    def disable(self, defer: bool = False) -> None:
+        """Disables the charger"""
+        self._set('$FD', defer)
+
+    def sleep(self, defer: bool = False) -> None:
+        """Puts the charger to sleep"""
+        self._set('$FS', defer)
+
+    def set_time_limit(self, minutes: int, defer: bool = False) -> None:
+        """Sets the time limit, in minutes rounded up to a multiple of 15, or removes it if minutes is 0"""
+        self._set('$S3 %d' % -(-minutes // 15), defer)
+
+    def set_charge_limit(self, kwh: int, defer: bool = False) -> None:
+        """Sets the charge limit in kWh, or removes it if kwh is 0"""
+        self._set('$SH %d' % kwh, defer)
+
+    def set_time(self, time: datetime.datetime, defer: bool = False) -> None:
+        """Sets the RTC time"""
+        self._set('$S1 %d %d %d %d %d %d' % (time.year - 2000, time.month, time.day, time.hour, time.minute,
+                                             time.second), defer)
+
+    def telemetry(self, charging_interval: float = 1, interval: float = 5,
+                  idle_interval: float = 60) -> Iterator[TelemetrySample]:
+        """Polls the charger's state, current, voltage, energy usage and temperatures forever, yielding a
+        TelemetrySample each time.  Samples are taken every charging_interval seconds while charging, every
+        idle_interval seconds while not connected, sleeping or disabled, and every interval seconds otherwise."""
+        while True:
+            started = time.monotonic()
+            replay = _ReplayCharger({command: self._query(command) for command in _telemetry_commands})
+            sample = TelemetrySample(time.time(), *(getattr(replay, name) for name in TelemetrySample._fields[1:]))
+            yield sample
+            wait = _telemetry_interval(sample.status, charging_interval, interval, idle_interval)
+            time.sleep(max(0, wait - (time.monotonic() - started)))
+
+    def snapshot(self) -> ChargerSnapshot:
+        """Reads every property of the charger at once, sending each distinct RAPI command only one time"""
+        replay = _ReplayCharger(self._query_many(command for _, command, _ in _snapshot_fields))
+        return ChargerSnapshot(*(getattr(replay, name) for name in ChargerSnapshot._fields))
+
+    def read(self, names: Iterable[str]) -> dict:
+        """Reads the named properties, sending each distinct RAPI command only one time, and returns their values
+        by name"""
+        names = list(names)
+        for name in names:
+            if name not in _property_commands:
+                raise ValueError('Unknown property: ' + name)
+        replay = _ReplayCharger(self._query_many(_property_commands[name] for name in names))
+        return {name: getattr(replay, name) for name in names}
 
     @deprecated(reason='Use the status property')
     def getStatus(self) -> str:
@@ -123,9 +1244,7 @@ class Charger:
     @property
     def status(self) -> str:
         """Returns the charger's charge status, as a string"""
-        command = '$GS'
-        status = self._send_command(command)
-        return states[int(status[1])]
+        return states[self._query('$GS').state]
 
     @deprecated(reason='Use the charge_time_elapsed property')
     def getChargeTimeElapsed(self) -> int:
@@ -134,10 +1253,9 @@ class Charger:
     @property
     def charge_time_elapsed(self) -> int:
         """Returns the charge time elapsed (in seconds), or 0 if is not currently charging"""
-        command = '$GS'
-        status = self._send_command(command)
-        if int(status[1]) == 3:
-            return int(status[2])
+        status = self._query('$GS')
+        if status.state == 3:
+            return status.elapsed
         else:
             return 0
 
@@ -148,9 +1266,7 @@ class Charger:
     @property
     def time_limit(self) -> int:
         """Returns the time limit in minutes or 0 if no limit is set"""
-        command = '$G3'
-        limit = self._send_command(command)
-        return int(limit[1])*15
+        return self._query('$G3').minutes
 
     @deprecated(reason='Use ammeter_scale_factor property')
     def getAmmeterScaleFactor(self) -> int:
@@ -159,9 +1275,7 @@ class Charger:
     @property
     def ammeter_scale_factor(self) -> int:
         """Returns the ammeter's current scale factor"""
-        command = '$GA'
-        settings = self._send_command(command)
-        return int(settings[1])
+        return self._query('$GA').scale_factor
 
     @deprecated(reason='Use ammeter_offset property')
     def getAmmeterOffset(self) -> int:
@@ -170,9 +1284,7 @@ class Charger:
     @property
     def ammeter_offset(self) -> int:
         """Returns the ammeter's current offset"""
-        command = '$GA'
-        settings = self._send_command(command)
-        return int(settings[2])
+        return self._query('$GA').offset
 
     @deprecated(reason='Use min_amps property')
     def getMinAmps(self) -> int:
@@ -181,9 +1293,7 @@ class Charger:
     @property
     def min_amps(self) -> int:
         """Returns the capacity range minimum, in amps"""
-        command = '$GC'
-        caprange = self._send_command(command)
-        return int(caprange[1])
+        return self._query('$GC').min_amps
 
     @deprecated(reason='Use max_amps property')
     def getMaxAmps(self) -> int:
@@ -192,9 +1302,7 @@ class Charger:
     @property
     def max_amps(self) -> int:
         """Returns the capacity range maximum, in amps"""
-        command = '$GC'
-        caprange = self._send_command(command)
-        return int(caprange[2])
+        return self._query('$GC').max_amps
 
     @deprecated(reason='Use current_capacity property')
     def getCurrentCapacity(self) -> int:
@@ -203,9 +1311,7 @@ class Charger:
     @property
     def current_capacity(self) -> int:
         """Returns the current capacity, in amps"""
-        command = '$GE'
-        settings = self._send_command(command)
-        return int(settings[1])
+        return self._query('$GE').current_capacity
 
     @deprecated(reason='Use service_level property')
     def getServiceLevel(self) -> int:
@@ -214,10 +1320,7 @@ class Charger:
     @property
     def service_level(self) -> int:
         """Returns the service level"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return (flags & 0x0001) + 1
+        return (self._query('$GE').flags & 0x0001) + 1
 
     @deprecated(reason='Use diode_check_enabled property')
     def getDiodeCheckEnabled(self) -> bool:
@@ -226,10 +1329,7 @@ class Charger:
     @property
     def diode_check_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0002)
+        return not (self._query('$GE').flags & 0x0002)
 
     @deprecated(reason='Use vent_required_enabled property')
     def getVentRequiredEnabled(self) -> bool:
@@ -238,10 +1338,7 @@ class Charger:
     @property
     def vent_required_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0004)
+        return not (self._query('$GE').flags & 0x0004)
 
     @deprecated(reason='Use ground_check_enabled property')
     def getGroundCheckEnabled(self) -> bool:
@@ -250,10 +1347,7 @@ class Charger:
     @property
     def ground_check_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0008)
+        return not (self._query('$GE').flags & 0x0008)
 
     @deprecated(reason='Use stuck_relay_check_enabled property')
     def getStuckRelayCheckEnabled(self) -> bool:
@@ -262,10 +1356,7 @@ class Charger:
     @property
     def stuck_relay_check_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0010)
+        return not (self._query('$GE').flags & 0x0010)
 
     @deprecated(reason='Use auto_service_level_enabled property')
     def getAutoServiceLevelEnabled(self) -> bool:
@@ -274,10 +1365,7 @@ class Charger:
     @property
     def auto_service_level_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0020)
+        return not (self._query('$GE').flags & 0x0020)
 
     @deprecated(reason='Use auto_start_enabled property')
     def getAutoStartEnabled(self) -> bool:
@@ -286,10 +1374,7 @@ class Charger:
     @property
     def auto_start_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0040)
+        return not (self._query('$GE').flags & 0x0040)
 
     @deprecated(reason='Use serial_debug_enabled property')
     def getSerialDebugEnabled(self) -> bool:
@@ -298,10 +1383,7 @@ class Charger:
     @property
     def serial_debug_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0080)
+        return not (self._query('$GE').flags & 0x0080)
 
     @deprecated(reason='Use lcd_type property')
     def getLCDType(self) -> str:
@@ -310,10 +1392,7 @@ class Charger:
     @property
     def lcd_type(self) -> str:
         """Returns LCD type as a string, either monochrome or rgb"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        if flags & 0x0100:
+        if self._query('$GE').flags & 0x0100:
             lcdtype = 'monochrome'
         else:
             lcdtype = 'rgb'
@@ -326,10 +1405,7 @@ class Charger:
     @property
     def gfi_self_test_enabled(self) -> bool:
         """Returns True if enabled, False if disabled"""
-        command = '$GE'
-        settings = self._send_command(command)
-        flags = int(settings[2], 16)
-        return not (flags & 0x0200)
+        return not (self._query('$GE').flags & 0x0200)
 
     @deprecated(reason='Use gfi_trip_count property')
     def getGFITripCount(self) -> int:
@@ -338,9 +1414,7 @@ class Charger:
     @property
     def gfi_trip_count(self) -> int:
         """Returns GFI Trip Count, as integer"""
-        command = '$GF'
-        faults = self._send_command(command)
-        return int(faults[1])
+        return self._query('$GF').gfi_trips
 
     @deprecated(reason='Use no_gnd_trip_count property')
     def getNoGndTripCount(self) -> int:
@@ -349,9 +1423,7 @@ class Charger:
     @property
     def no_gnd_trip_count(self) -> int:
         """Returns No Ground Trip Count, as integer"""
-        command = '$GF'
-        faults = self._send_command(command)
-        return int(faults[2])
+        return self._query('$GF').no_gnd_trips
 
     @deprecated(reason='Use stuck_relay_trip_count property')
     def getStuckRelayTripCount(self) -> int:
@@ -360,9 +1432,7 @@ class Charger:
     @property
     def stuck_relay_trip_count(self) -> int:
         """Returns Stuck Relay Trip Count, as integer"""
-        command = '$GF'
-        faults = self._send_command(command)
-        return int(faults[3])
+        return self._query('$GF').stuck_relay_trips
 
     @deprecated(reason='Use charging_current property')
     def getChargingCurrent(self) -> float:
@@ -371,9 +1441,7 @@ class Charger:
     @property
     def charging_current(self) -> float:
         """Returns the charging current, in amps, or 0.0 of not charging"""
-        command = '$GG'
-        current_and_voltage = self._send_command(command)
-        amps = float(current_and_voltage[1])/1000
+        amps = self._query('$GG').current
         return amps if amps > 0 else 0.0
 
     @deprecated(reason='Use charging_voltage property')
@@ -383,9 +1451,7 @@ class Charger:
     @property
     def charging_voltage(self) -> float:
         """Returns the charging voltage, in volts, or 0.0 of not charging"""
-        command = '$GG'
-        current_and_voltage = self._send_command(command)
-        volts = float(current_and_voltage[2])/1000
+        volts = self._query('$GG').voltage
         return volts if volts > 0 else 0.0
 
     @deprecated(reason='Use charge_limit property')
@@ -395,9 +1461,7 @@ class Charger:
     @property
     def charge_limit(self) -> int:
         """Returns the charge limit in kWh"""
-        command = '$GH'
-        limit = self._send_command(command)
-        return int(limit[1])
+        return self._query('$GH').kwh
 
     @deprecated(reason='Use volt_meter_scale_factor property')
     def getVoltMeterScaleFactor(self) -> int:
@@ -406,12 +1470,7 @@ class Charger:
     @property
     def volt_meter_scale_factor(self) -> int:
         """Returns the voltmeter scale factor, or 0 if there is no voltmeter"""
-        command = '$GM'
-        volt_meter_settings = self._send_command(command)
-        if volt_meter_settings[0] == 'NK':
-            return 0
-        else:
-            return int(volt_meter_settings[1])
+        return self._query('$GM').scale_factor
 
     @deprecated(reason='Use volt_meter_offset property')
     def getVoltMeterOffset(self) -> int:
@@ -420,12 +1479,7 @@ class Charger:
     @property
     def volt_meter_offset(self) -> int:
         """Returns the voltmeter offset, or 0 if there is no voltmeter"""
-        command = '$GM'
-        volt_meter_settings = self._send_command(command)
-        if volt_meter_settings[0] == 'NK':
-            return 0
-        else:
-            return int(volt_meter_settings[2])
+        return self._query('$GM').offset
 
     @deprecated(reason='Use ambient_threshold property')
     def getAmbientThreshold(self) -> float:
@@ -434,12 +1488,7 @@ class Charger:
     @property
     def ambient_threshold(self) -> float:
         """Returns the ambient temperature threshold in degrees Celcius, or 0 if no Threshold is set"""
-        command = '$GO'
-        threshold = self._send_command(command)
-        if threshold[0] == 'NK':
-            return 0.0
-        else:
-            return float(threshold[1])/10
+        return self._query('$GO').ambient
 
     @deprecated(reason='Use ir_threshold property')
     def getIRThreshold(self) -> float:
@@ -448,12 +1497,7 @@ class Charger:
     @property
     def ir_threshold(self) -> float:
         """Returns the IR temperature threshold in degrees Celcius, or 0 if no Threshold is set"""
-        command = '$GO'
-        threshold = self._send_command(command)
-        if threshold[0] == 'NK':
-            return 0.0
-        else:
-            return float(threshold[2])/10
+        return self._query('$GO').ir
 
     @deprecated(reason='Use rtc_temperature property')
     def getRTCTemperature(self) -> float:
@@ -463,9 +1507,7 @@ class Charger:
     def rtc_temperature(self) -> float:
         """Returns the temperature of the real time clock sensor (DS3231), in degrees Celcius, or 0.0 if sensor is not
         installed"""
-        command = '$GP'
-        temperature = self._send_command(command)
-        return float(temperature[1])/10
+        return self._query('$GP').rtc
 
     @deprecated(reason='Use ambient_temperature property')
     def getAmbientTemperature(self) -> float:
@@ -475,9 +1517,7 @@ class Charger:
     def ambient_temperature(self) -> float:
         """Returns the temperature of the ambient sensor (MCP9808), in degrees Celcius, or 0.0 if sensor is not
         installed"""
-        command = '$GP'
-        temperature = self._send_command(command)
-        return float(temperature[2])/10
+        return self._query('$GP').ambient
 
     @deprecated(reason='Use ir_temperature property')
     def getIRTemperature(self) -> float:
@@ -487,9 +1527,7 @@ class Charger:
     def ir_temperature(self) -> float:
         """Returns the temperature of the IR remote sensor (TMP007), in degrees Celcius, or 0.0 if sensor is not
         installed"""
-        command = '$GP'
-        temperature = self._send_command(command)
-        return float(temperature[3])/10
+        return self._query('$GP').ir
 
     @deprecated(reason='Use the time property')
     def getTime(self) -> Optional[datetime.datetime]:
@@ -498,17 +1536,7 @@ class Charger:
     @property
     def time(self) -> Optional[datetime.datetime]:
         """Get the RTC time.  Returns a datetime object, or NULL if the clock is not set"""
-        command = '$GT'
-        time = self._send_command(command)
-        if time == ['OK', '165', '165', '165', '165', '165', '85']:
-            return None
-        else:
-            return datetime.datetime(year=int(time[1])+2000,
-                                     month=int(time[2]),
-                                     day=int(time[3]),
-                                     hour=int(time[4]),
-                                     minute=int(time[5]),
-                                     second=int(time[6]))
+        return self._query('$GT').time
 
     @deprecated(reason='Use usage_session property')
     def getUsageSession(self) -> float:
@@ -517,9 +1545,7 @@ class Charger:
     @property
     def usage_session(self) -> float:
         """Get the energy usage for the current charging session.  Returns the energy usage in Wh"""
-        command = '$GU'
-        usage = self._send_command(command)
-        return float(usage[1])/3600
+        return self._query('$GU').session
 
     @deprecated(reason='Use usage_total property')
     def getUsageTotal(self) -> float:
@@ -528,9 +1554,7 @@ class Charger:
     @property
     def usage_total(self) -> float:
         """Get the total energy usage.  Returns the energy usage in Wh"""
-        command = '$GU'
-        usage = self._send_command(command)
-        return float(usage[2])
+        return self._query('$GU').total
 
     @deprecated(reason='Use firmware_version property')
     def getFirmwareVersion(self) -> str:
@@ -539,9 +1563,7 @@ class Charger:
     @property
     def firmware_version(self) -> str:
         """Returns the Firmware Version, as a string"""
-        command = '$GV'
-        version = self._send_command(command)
-        return version[1]
+        return self._query('$GV').firmware
 
     @deprecated(reason='Use protocol_version property')
     def getProtocolVersion(self) -> str:
@@ -550,6 +1572,13 @@ class Charger:
     @property
     def protocol_version(self) -> str:
         """Returns the Protocol Version, as a string"""
-        command = '$GV'
-        version = self._send_command(command)
-        return version[2]
+        return self._query('$GV').protocol
+
+
+class _ReplayCharger(Charger):
+    """Answers queries from records that have already been fetched, to evaluate properties offline"""
+    def __init__(self, records: dict):
+        self._records = records
+
+    def _query(self, command: str) -> tuple:
+        return self._records[command]
@@ -0,0 +1,306 @@
+"""
+An asyncio client for the OpenEVSE wifi kit.  Requires the optional aiohttp dependency:
+
+    pip install openevsewifi[async]
+"""
+import asyncio
+import base64
+import datetime
+import time
+
+from collections import OrderedDict
+
+import aiohttp
+
+from typing import (
+  AsyncIterator,
+  List,
+  Optional
+)
+
+from openevsewifi import (
+  ChargerSnapshot,
+  Instrumentation,
+  InvalidAuthentication,
+  RequestLimiter,
+  ResponseCache,
+  TelemetrySample,
+  _ReplayCharger,
+  _XmlParser,
+  _command_name,
+  _property_commands,
+  _records,
+  _snapshot_fields,
+  _telemetry_commands,
+  _telemetry_interval,
+  json_parser
+)
+
+
+class AsyncCharger:
+    def __init__(self, host: str, json: bool = False, username: str = None, password: str = None,
+                 pool_size: int = 1, timeout: float = 10, cache: ResponseCache = None,
+                 session: aiohttp.ClientSession = None, instrumentation: Instrumentation = None,
+                 limiter: RequestLimiter = None):
+        """An asyncio connection to an OpenEVSE charging station equipped with the wifi kit.
+
+        Every property of Charger is available as a coroutine method of the same name.  Requests go through a pooled
+        aiohttp session holding at most pool_size connections to the charger, and each one is aborted with
+        asyncio.TimeoutError after timeout seconds.  Pass a shared session to poll many chargers over one pool; it is
+        then left open by close().  An Instrumentation is told the network and parse time of every request, and
+        every error.  Requests wait for limiter, by default one allowing pool_size requests in flight at a time; pass
+        openevsewifi.shared_transports.limiter(host) to share the limit with threaded Chargers."""
+        self._host = host
+        if json:
+            self._url = 'http://' + host + '/r?json=1&'
+            self._parseResult = json_parser
+        else:
+            self._url = 'http://' + host + '/r?'
+            self._parseResult = _XmlParser()
+        self._headers = {}
+        if username and password:
+            credentials = base64.b64encode((username + ':' + password).encode('utf-8')).decode('ascii')
+            self._headers['Authorization'] = 'Basic ' + credentials
+        self._pool_size = pool_size
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._cache = cache
+        self._session = session
+        self._owns_session = session is None
+        self._instrumentation = instrumentation
+        self._limiter = limiter or RequestLimiter(pool_size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes any connections held open to the charger"""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # aiohttp sessions must be created from inside the running event loop.
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=self._pool_size)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _query(self, command: str) -> tuple:
+        """Sends a query command and decodes the response into its record"""
+        if self._cache is not None:
+            record = self._cache.get(command, self._host)
+            if record is not None:
+                return record
+        record = _records[command].decode(await self._send_command(command))
+        if self._cache is not None:
+            self._cache.put(command, record, self._host)
+        return record
+
+    async def _send_command(self, command: str) -> List[str]:
+        """Sends a command through the web interface of the charger and parses the response"""
+        await self._limiter.acquire_async()
+        try:
+            return await self._send_limited(command)
+        finally:
+            self._limiter.release()
+
+    async def _send_limited(self, command: str) -> List[str]:
+        if self._instrumentation is None:
+            text = await self._post(command)
+            return self._parseResult(text)
+        try:
+            started = time.perf_counter()
+            text = await self._post(command)
+            received = time.perf_counter()
+            response = self._parseResult(text)
+        except Exception as error:
+            self._instrumentation.on_error(self._host, _command_name(command), error)
+            raise
+        self._instrumentation.on_response(self._host, _command_name(command), received - started,
+                                          time.perf_counter() - received)
+        return response
+
+    async def _post(self, command: str) -> str:
+        data = {'rapi': command}
+        session = self._get_session()
+        async with session.post(self._url, data=data, headers=self._headers, timeout=self._timeout) as content:
+            if content.status == 401:
+                raise InvalidAuthentication
+            return await content.text()
+
+    async def _get(self, name: str):
+        command = _property_commands[name]
+        record = await self._query(command)
+        return getattr(_ReplayCharger({command: record}), name)
+
+    async def telemetry(self, charging_interval: float = 1, interval: float = 5,
+                        idle_interval: float = 60) -> AsyncIterator[TelemetrySample]:
+        """Polls the charger's state, current, voltage, energy usage and temperatures forever, yielding a
+        TelemetrySample each time.  Samples are taken every charging_interval seconds while charging, every
+        idle_interval seconds while not connected, sleeping or disabled, and every interval seconds otherwise."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            records = await asyncio.gather(*(self._query(command) for command in _telemetry_commands))
+            replay = _ReplayCharger(dict(zip(_telemetry_commands, records)))
+            sample = TelemetrySample(time.time(), *(getattr(replay, name) for name in TelemetrySample._fields[1:]))
+            yield sample
+            wait = _telemetry_interval(sample.status, charging_interval, interval, idle_interval)
+            await asyncio.sleep(max(0, wait - (loop.time() - started)))
+
+    async def snapshot(self) -> ChargerSnapshot:
+        """Reads every property of the charger at once, sending each distinct RAPI command only one time"""
+        commands = list(OrderedDict.fromkeys(command for _, command, _ in _snapshot_fields))
+        records = await asyncio.gather(*(self._query(command) for command in commands))
+        replay = _ReplayCharger(dict(zip(commands, records)))
+        return ChargerSnapshot(*(getattr(replay, name) for name in ChargerSnapshot._fields))
+
+    async def status(self) -> str:
+        """Returns the charger's charge status, as a string"""
+        return await self._get('status')
+
+    async def charge_time_elapsed(self) -> int:
+        """Returns the charge time elapsed (in seconds), or 0 if is not currently charging"""
+        return await self._get('charge_time_elapsed')
+
+    async def time_limit(self) -> int:
+        """Returns the time limit in minutes or 0 if no limit is set"""
+        return await self._get('time_limit')
+
+    async def ammeter_scale_factor(self) -> int:
+        """Returns the ammeter's current scale factor"""
+        return await self._get('ammeter_scale_factor')
+
+    async def ammeter_offset(self) -> int:
+        """Returns the ammeter's current offset"""
+        return await self._get('ammeter_offset')
+
+    async def min_amps(self) -> int:
+        """Returns the capacity range minimum, in amps"""
+        return await self._get('min_amps')
+
+    async def max_amps(self) -> int:
+        """Returns the capacity range maximum, in amps"""
+        return await self._get('max_amps')
+
+    async def current_capacity(self) -> int:
+        """Returns the current capacity, in amps"""
+        return await self._get('current_capacity')
+
+    async def service_level(self) -> int:
+        """Returns the service level"""
+        return await self._get('service_level')
+
+    async def diode_check_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('diode_check_enabled')
+
+    async def vent_required_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('vent_required_enabled')
+
+    async def ground_check_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('ground_check_enabled')
+
+    async def stuck_relay_check_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('stuck_relay_check_enabled')
+
+    async def auto_service_level_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('auto_service_level_enabled')
+
+    async def auto_start_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('auto_start_enabled')
+
+    async def serial_debug_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('serial_debug_enabled')
+
+    async def lcd_type(self) -> str:
+        """Returns LCD type as a string, either monochrome or rgb"""
+        return await self._get('lcd_type')
+
+    async def gfi_self_test_enabled(self) -> bool:
+        """Returns True if enabled, False if disabled"""
+        return await self._get('gfi_self_test_enabled')
+
+    async def gfi_trip_count(self) -> int:
+        """Returns GFI Trip Count, as integer"""
+        return await self._get('gfi_trip_count')
+
+    async def no_gnd_trip_count(self) -> int:
+        """Returns No Ground Trip Count, as integer"""
+        return await self._get('no_gnd_trip_count')
+
+    async def stuck_relay_trip_count(self) -> int:
+        """Returns Stuck Relay Trip Count, as integer"""
+        return await self._get('stuck_relay_trip_count')
+
+    async def charging_current(self) -> float:
+        """Returns the charging current, in amps, or 0.0 of not charging"""
+        return await self._get('charging_current')
+
+    async def charging_voltage(self) -> float:
+        """Returns the charging voltage, in volts, or 0.0 of not charging"""
+        return await self._get('charging_voltage')
+
+    async def charge_limit(self) -> int:
+        """Returns the charge limit in kWh"""
+        return await self._get('charge_limit')
+
+    async def volt_meter_scale_factor(self) -> int:
+        """Returns the voltmeter scale factor, or 0 if there is no voltmeter"""
+        return await self._get('volt_meter_scale_factor')
+
+    async def volt_meter_offset(self) -> int:
+        """Returns the voltmeter offset, or 0 if there is no voltmeter"""
+        return await self._get('volt_meter_offset')
+
+    async def ambient_threshold(self) -> float:
+        """Returns the ambient temperature threshold in degrees Celcius, or 0 if no Threshold is set"""
+        return await self._get('ambient_threshold')
+
+    async def ir_threshold(self) -> float:
+        """Returns the IR temperature threshold in degrees Celcius, or 0 if no Threshold is set"""
+        return await self._get('ir_threshold')
+
+    async def rtc_temperature(self) -> float:
+        """Returns the temperature of the real time clock sensor (DS3231), in degrees Celcius, or 0.0 if sensor is not
+        installed"""
+        return await self._get('rtc_temperature')
+
+    async def ambient_temperature(self) -> float:
+        """Returns the temperature of the ambient sensor (MCP9808), in degrees Celcius, or 0.0 if sensor is not
+        installed"""
+        return await self._get('ambient_temperature')
+
+    async def ir_temperature(self) -> float:
+        """Returns the temperature of the IR remote sensor (TMP007), in degrees Celcius, or 0.0 if sensor is not
+        installed"""
+        return await self._get('ir_temperature')
+
+    async def time(self) -> Optional[datetime.datetime]:
+        """Get the RTC time.  Returns a datetime object, or NULL if the clock is not set"""
+        return await self._get('time')
+
+    async def usage_session(self) -> float:
+        """Get the energy usage for the current charging session.  Returns the energy usage in Wh"""
+        return await self._get('usage_session')
+
+    async def usage_total(self) -> float:
+        """Get the total energy usage.  Returns the energy usage in Wh"""
+        return await self._get('usage_total')
+
+    async def firmware_version(self) -> str:
+        """Returns the Firmware Version, as a string"""
+        return await self._get('firmware_version')
+
+    async def protocol_version(self) -> str:
+        """Returns the Protocol Version, as a string"""
+        return await self._get('protocol_version')
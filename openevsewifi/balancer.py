@@ -0,0 +1,163 @@
+"""
+Site-level load balancing: sharing a current budget between several chargers.
+"""
+import math
+
+from typing import (
+  Iterable,
+  List,
+  NamedTuple,
+  Optional,
+  Sequence,
+  Tuple
+)
+
+from openevsewifi import (
+  Charger,
+  _ReplayCharger
+)
+
+Allocation = NamedTuple('Allocation', [('charger', Charger), ('status', str), ('current_capacity', int),
+                                       ('amps', Optional[int]), ('error', Optional[Exception])])
+Allocation.__doc__ = """The current allocated to one charger.  amps is None for chargers that are not in use, which are
+left alone, and 0 for chargers in use that the budget cannot cover, which LoadBalancer.apply() pauses.  error is the
+exception reading or updating the charger failed with, or None.  A charger that could not be read has no status or
+amps, and gets no share of the budget"""
+
+# The commands read from every charger to plan an allocation.
+_balancer_commands = ('$GS', '$GE', '$GC', '$GG')
+
+
+def _fair_level(ranges: Sequence[Tuple[float, float]], budget: float) -> float:
+    """Returns the level L such that clamping L into every (low, high) range adds up to budget, given that budget
+    lies between the sum of the lows and the sum of the highs.  Runs in O(n log n) by sweeping the range ends."""
+    events = sorted([(low, 1) for low, _ in ranges] + [(high, -1) for _, high in ranges],
+                    key=lambda event: (event[0], -event[1]))
+    total = sum(low for low, _ in ranges)
+    slope = 0
+    previous = events[0][0]
+    for position, change in events:
+        reached = total + slope * (position - previous)
+        if reached >= budget and slope:
+            return previous + (budget - total) / slope
+        total = reached
+        previous = position
+        slope += change
+    return previous
+
+
+def allocate(ranges: Sequence[Tuple[int, int]], budget: float) -> List[int]:
+    """Shares budget amps fairly between units that can each draw between (min, max) amps, in whole amps.
+
+    Every unit gets the same current where the ranges allow it: units whose max is below the fair share get their
+    max, and units whose min is above it get their min.  If the budget cannot cover every unit's min, units are
+    served in the order given and the rest get 0."""
+    served = []
+    remaining = budget
+    for low, high in ranges:
+        if low <= remaining:
+            served.append((low, high))
+            remaining -= low
+        else:
+            break
+    amps = [0] * len(ranges)
+    if not served:
+        return amps
+    if sum(high for _, high in served) <= budget:
+        level = math.inf
+    else:
+        level = _fair_level(served, budget)
+    for i, (low, high) in enumerate(served):
+        amps[i] = int(min(max(level, low), high))
+    # Hand out the amps lost to rounding down, one each, in the order given.
+    leftover = int(budget - sum(amps))
+    for i, (_, high) in enumerate(served):
+        if leftover <= 0:
+            break
+        if amps[i] < high:
+            amps[i] += 1
+            leftover -= 1
+    return amps
+
+
+class LoadBalancer:
+    def __init__(self, chargers: Iterable[Charger], budget: float,
+                 active_states: Sequence[str] = ('connected', 'charging'), headroom: float = None):
+        """Shares a site current budget, in amps, between chargers.
+
+        Only chargers whose status is in active_states share the budget; the others are left alone.  Each one gets
+        an allocation within its capacity range ($GC).  If headroom is given, a charging vehicle drawing less than
+        its current capacity is allocated no more than its measured current plus headroom amps, leaving the rest to
+        the other chargers."""
+        self._chargers = list(chargers)
+        self.budget = budget
+        self._active_states = tuple(active_states)
+        self._headroom = headroom
+        # The chargers apply() has put to sleep, which keep sharing the budget so they can be woken again.
+        self._paused = set()
+
+    def _active(self, charger: Charger, status: str) -> bool:
+        return status in self._active_states or (charger in self._paused and status == 'sleeping')
+
+    def plan(self) -> List[Allocation]:
+        """Reads every charger and returns the allocation for each, in the order the chargers were given"""
+        readings = []
+        ranges = []
+        for charger in self._chargers:
+            try:
+                reading = _ReplayCharger(charger._query_many(_balancer_commands))
+            except Exception as error:
+                readings.append(error)
+                continue
+            readings.append(reading)
+            if self._active(charger, reading.status):
+                high = reading.max_amps
+                if self._headroom is not None and reading.status == 'charging':
+                    high = min(high, max(reading.min_amps, math.ceil(reading.charging_current + self._headroom)))
+                ranges.append((reading.min_amps, high))
+        amps = iter(allocate(ranges, self.budget))
+        return [Allocation(charger, None, None, None, reading) if isinstance(reading, Exception)
+                else Allocation(charger, reading.status, reading.current_capacity,
+                                next(amps) if self._active(charger, reading.status) else None, None)
+                for charger, reading in zip(self._chargers, readings)]
+
+    def apply(self) -> List[Allocation]:
+        """Plans the allocations and sets the current capacity of every charger whose allocation differs from its
+        current setting.  Returns the allocations.
+
+        Chargers allocated 0 amps are paused with sleep(), since even their minimum current would overrun the
+        budget, and are woken with enable() once the budget covers them again.  Every decrease, pause included, is
+        applied before any increase, so the site never draws more than the old or the new budget in between.
+
+        A charger that cannot be read or updated does not stop the others: its allocation carries the error."""
+        allocations = self.plan()
+        increases = []
+        for index, allocation in enumerate(allocations):
+            charger = allocation.charger
+            if allocation.error is not None:
+                continue
+            try:
+                if allocation.amps is None:
+                    self._paused.discard(charger)
+                elif allocation.amps == 0:
+                    if allocation.status != 'sleeping':
+                        charger.sleep()
+                        self._paused.add(charger)
+                elif charger in self._paused or allocation.amps > allocation.current_capacity:
+                    increases.append(index)
+                elif allocation.amps < allocation.current_capacity:
+                    charger.set_current_capacity(allocation.amps)
+            except Exception as error:
+                allocations[index] = allocation._replace(error=error)
+        for index in increases:
+            allocation = allocations[index]
+            charger = allocation.charger
+            try:
+                if allocation.amps != allocation.current_capacity:
+                    charger.set_current_capacity(allocation.amps)
+                if charger in self._paused:
+                    charger.enable()
+                    self._paused.discard(charger)
+            except Exception as error:
+                allocations[index] = allocation._replace(error=error)
+        return allocations
@@ -0,0 +1,94 @@
+"""
+Concurrent polling of many OpenEVSE chargers from one event loop.  Requires the optional aiohttp dependency:
+
+    pip install openevsewifi[async]
+"""
+import asyncio
+
+from collections import OrderedDict
+from typing import (
+  AsyncIterator,
+  Iterable,
+  List,
+  NamedTuple,
+  Optional,
+  Union
+)
+
+from openevsewifi import (
+  ChargerSnapshot,
+  _ReplayCharger,
+  _property_commands
+)
+from openevsewifi.aio import AsyncCharger
+
+PollResult = NamedTuple('PollResult', [('host', str), ('values', Optional[dict]), ('error', Optional[Exception])])
+PollResult.__doc__ = """The outcome of polling one charger: values maps property names to their values, or error
+holds the exception that stopped the poll"""
+
+
+async def _read(charger: AsyncCharger, properties: List[str]) -> dict:
+    """Reads the given properties from charger, sending each distinct RAPI command only one time"""
+    commands = list(OrderedDict.fromkeys(_property_commands[name] for name in properties))
+    records = {}
+    for command in commands:
+        records[command] = await charger._query(command)
+    replay = _ReplayCharger(records)
+    return OrderedDict((name, getattr(replay, name)) for name in properties)
+
+
+class ChargerFleet:
+    def __init__(self, chargers: Iterable[AsyncCharger], concurrency: int = 32, timeout: float = 30):
+        """A group of chargers polled concurrently.
+
+        At most concurrency chargers are polled at the same time, and each poll is abandoned after timeout seconds.
+        A charger that times out or fails does not hold up the others; its PollResult carries the error instead."""
+        self._chargers = list(chargers)
+        self._concurrency = concurrency
+        self._timeout = timeout
+
+    @classmethod
+    def from_hosts(cls, hosts: Iterable[Union[str, tuple]], concurrency: int = 32, timeout: float = 30,
+                   **kwargs) -> 'ChargerFleet':
+        """Builds a fleet from host names, or (host, username, password) tuples for chargers needing credentials.
+        Any other keyword arguments are passed on to every AsyncCharger."""
+        chargers = []
+        for host in hosts:
+            if isinstance(host, str):
+                chargers.append(AsyncCharger(host, **kwargs))
+            else:
+                host, username, password = host
+                chargers.append(AsyncCharger(host, username=username, password=password, **kwargs))
+        return cls(chargers, concurrency=concurrency, timeout=timeout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes the connections of every charger in the fleet"""
+        await asyncio.gather(*(charger.close() for charger in self._chargers))
+
+    async def poll(self, properties: Iterable[str] = None) -> AsyncIterator[PollResult]:
+        """Polls the given properties, or every property if none are given, on all chargers in the fleet.  Results
+        are yielded as each charger completes, not in the order the chargers were given."""
+        properties = list(properties) if properties is not None else list(ChargerSnapshot._fields)
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def poll_one(charger):
+            async with semaphore:
+                try:
+                    values = await asyncio.wait_for(_read(charger, properties), self._timeout)
+                except Exception as error:
+                    return PollResult(charger._host, None, error)
+                return PollResult(charger._host, values, None)
+
+        tasks = [asyncio.ensure_future(poll_one(charger)) for charger in self._chargers]
+        try:
+            for result in asyncio.as_completed(tasks):
+                yield await result
+        finally:
+            for task in tasks:
+                task.cancel()
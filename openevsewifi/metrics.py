@@ -0,0 +1,98 @@
+"""
+Request metrics for Charger and AsyncCharger, with export in the Prometheus text format.
+"""
+import bisect
+import threading
+
+from collections import defaultdict
+from typing import (
+  List,
+  Sequence,
+  Tuple
+)
+
+from openevsewifi import Instrumentation
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Counts observations into buckets with the given upper bounds, keeping their count and sum"""
+    def __init__(self, buckets: Sequence[float] = default_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Returns (upper bound, count of observations at or below it) pairs, ending with '+Inf'"""
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            pairs.append((str(bound), total))
+        return pairs
+
+
+class MetricsCollector(Instrumentation):
+    def __init__(self, buckets: Sequence[float] = default_buckets):
+        """Collects per-command request counts, network and parse latency histograms, and error counts by exception
+        type, for every charger it is passed to.  Safe to share between chargers and threads."""
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.network_seconds = {}
+        self.parse_seconds = {}
+        self.errors = defaultdict(int)
+
+    def on_response(self, host: str, command: str, network_seconds: float, parse_seconds: float) -> None:
+        key = (host, command)
+        with self._lock:
+            self.requests[key] += 1
+            if key not in self.network_seconds:
+                self.network_seconds[key] = Histogram(self._buckets)
+                self.parse_seconds[key] = Histogram(self._buckets)
+            self.network_seconds[key].observe(network_seconds)
+            self.parse_seconds[key].observe(parse_seconds)
+
+    def on_error(self, host: str, command: str, error: Exception) -> None:
+        with self._lock:
+            self.errors[(host, command, type(error).__name__)] += 1
+
+    def prometheus(self, prefix: str = 'openevse_rapi') -> str:
+        """Returns every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP %s_requests_total RAPI commands answered successfully.' % prefix)
+            lines.append('# TYPE %s_requests_total counter' % prefix)
+            for (host, command), count in sorted(self.requests.items()):
+                lines.append('%s_requests_total{%s} %d' % (prefix, _labels(host=host, command=command), count))
+            for name, histograms, description in (
+                    ('network_seconds', self.network_seconds, 'Time spent waiting for the charger to respond.'),
+                    ('parse_seconds', self.parse_seconds, 'Time spent parsing responses.')):
+                lines.append('# HELP %s_%s %s' % (prefix, name, description))
+                lines.append('# TYPE %s_%s histogram' % (prefix, name))
+                for (host, command), histogram in sorted(histograms.items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append('%s_%s_bucket{%s} %d'
+                                     % (prefix, name, _labels(host=host, command=command, le=bound), count))
+                    labels = _labels(host=host, command=command)
+                    lines.append('%s_%s_sum{%s} %r' % (prefix, name, labels, histogram.sum))
+                    lines.append('%s_%s_count{%s} %d' % (prefix, name, labels, histogram.count))
+            lines.append('# HELP %s_errors_total Failed RAPI requests, by exception type.' % prefix)
+            lines.append('# TYPE %s_errors_total counter' % prefix)
+            for (host, command, error), count in sorted(self.errors.items()):
+                lines.append('%s_errors_total{%s} %d'
+                             % (prefix, _labels(host=host, command=command, error=error), count))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels) -> str:
+    return ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in sorted(labels.items()))
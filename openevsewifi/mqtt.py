@@ -0,0 +1,201 @@
+"""
+Reads chargers from the MQTT topics their wifi modules publish to, instead of polling them.  Requires the optional
+paho-mqtt dependency:
+
+    pip install openevsewifi[mqtt]
+
+A wifi module configured for MQTT publishes each of its /status values to its own topic under a base topic, such as
+openevse-1234/amp or openevse-1234/state.  One MqttIngestor subscribes to the base topics of any number of chargers
+over a single broker connection, and returns an MqttCharger for each, with the properties of Charger.
+"""
+import threading
+
+from collections import OrderedDict
+from typing import (
+  List,
+  Union
+)
+
+import paho.mqtt.client as mqtt
+
+from openevsewifi import (
+  Capabilities,
+  Charger,
+  ChargerSnapshot,
+  PushState,
+  _ReplayCharger,
+  _snapshot_fields
+)
+
+
+class NotPublished(Exception):
+    """Raised when reading a property that a charger does not publish over MQTT, or has not published yet, or when
+    sending it a command, and no fallback charger was given to poll or send to instead"""
+    pass
+
+
+def _value(payload: bytes) -> Union[int, float, str]:
+    text = payload.decode('utf-8', 'replace').strip()
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+class MqttCharger(Charger):
+    def __init__(self, base_topic: str, fallback: Charger = None):
+        """The properties of one charger, read from the values it has published under base_topic.  Properties it
+        does not publish are read from fallback, if given, and setters and probe() are sent to it; without a
+        fallback they raise NotPublished.  Created by MqttIngestor.add()."""
+        super().__init__(fallback._host if fallback is not None else base_topic, bulk=False)
+        self.base_topic = base_topic
+        self.push_state = PushState()
+        self._fallback = fallback
+
+    def close(self) -> None:
+        """Releases the charger's own resources.  The connection to the broker belongs to the MqttIngestor, and the
+        fallback charger to the caller."""
+        super().close()
+
+    def wait_for_update(self, timeout: float = None) -> bool:
+        """Blocks until the charger next publishes a value, and returns False if timeout seconds pass first"""
+        return self.push_state.wait(self.push_state.updates + 1, timeout)
+
+    def probe(self, refresh: bool = False) -> Capabilities:
+        """Returns what the fallback charger supports.  Raises NotPublished if there is no fallback."""
+        if self._fallback is None:
+            raise NotPublished('$GV')
+        return self._fallback.probe(refresh)
+
+    def _send_command(self, command: str) -> List[str]:
+        if self._fallback is None:
+            raise NotPublished(command)
+        return self._fallback._send_command(command)
+
+    def _set(self, command: str, defer: bool) -> None:
+        if defer:
+            super()._set(command, True)
+        elif self._fallback is None:
+            raise NotPublished(command)
+        else:
+            # Through the fallback, so that its cache forgets the old setting.
+            self._fallback._set(command, False)
+
+    def _query(self, command: str) -> tuple:
+        record = self.push_state.record(command)
+        if record is not None:
+            return record
+        if self._fallback is None:
+            raise NotPublished(command)
+        return self._fallback._query(command)
+
+    def _query_many(self, commands) -> dict:
+        commands = list(OrderedDict.fromkeys(commands))
+        records = {}
+        for command in commands:
+            record = self.push_state.record(command)
+            if record is not None:
+                records[command] = record
+        missing = [command for command in commands if command not in records]
+        if missing and self._fallback is None:
+            raise NotPublished(', '.join(missing))
+        if missing:
+            records.update(self._fallback._query_many(missing))
+        return {command: records[command] for command in commands}
+
+    def snapshot(self) -> ChargerSnapshot:
+        """Returns every property at once.  Without a fallback charger, the properties that have not been published
+        are None."""
+        if self._fallback is not None:
+            return super().snapshot()
+        records = {}
+        for _, command, _ in _snapshot_fields:
+            record = self.push_state.record(command)
+            if record is not None:
+                records[command] = record
+        replay = _ReplayCharger(records)
+        return ChargerSnapshot(*(getattr(replay, name) if command in records else None
+                                 for name, command, _ in _snapshot_fields))
+
+
+class MqttIngestor:
+    def __init__(self, host: str = 'localhost', port: int = 1883, username: str = None, password: str = None,
+                 keepalive: int = 60, client: mqtt.Client = None):
+        """Subscribes to the topics of many chargers over one connection to the MQTT broker at host:port.
+
+        Add chargers with add(), then call start(), or use the ingestor as a context manager, to connect; the
+        connection is kept open, and re-established if it drops, from a background thread.  While it is down the
+        chargers' published values are not used.  Pass a configured paho Client to set up TLS or other options."""
+        self._host = host
+        self._port = port
+        self._keepalive = keepalive
+        self._client = client or mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        if username:
+            self._client.username_pw_set(username, password)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+        self._chargers = {}
+        self._connected = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def add(self, base_topic: str, fallback: Charger = None) -> MqttCharger:
+        """Subscribes to the topics under base_topic, and returns the charger publishing to them.  Properties it does
+        not publish are read from fallback, if given."""
+        base_topic = base_topic.rstrip('/')
+        with self._lock:
+            charger = self._chargers.get(base_topic)
+            if charger is None:
+                charger = MqttCharger(base_topic, fallback)
+                self._chargers[base_topic] = charger
+                charger.push_state.set_connected(self._connected)
+                if self._connected:
+                    self._client.subscribe(base_topic + '/+')
+        return charger
+
+    def start(self) -> None:
+        """Connects to the broker from a background thread"""
+        self._client.connect_async(self._host, self._port, self._keepalive)
+        self._client.loop_start()
+
+    def stop(self) -> None:
+        """Disconnects from the broker"""
+        self._client.disconnect()
+        self._client.loop_stop()
+        self._set_connected(False)
+
+    def _set_connected(self, connected: bool) -> None:
+        with self._lock:
+            self._connected = connected
+            chargers = list(self._chargers.values())
+        for charger in chargers:
+            charger.push_state.set_connected(connected)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            return
+        with self._lock:
+            topics = [base_topic + '/+' for base_topic in self._chargers]
+        # Subscriptions are lost with the session, so they are made again on every connection.
+        if topics:
+            client.subscribe([(topic, 0) for topic in topics])
+        self._set_connected(True)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties) -> None:
+        self._set_connected(False)
+
+    def _on_message(self, client, userdata, message) -> None:
+        base_topic, _, name = message.topic.rpartition('/')
+        with self._lock:
+            charger = self._chargers.get(base_topic)
+        if charger is not None:
+            charger.push_state.update({name: _value(message.payload)})
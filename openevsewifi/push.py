@@ -0,0 +1,187 @@
+"""
+Push updates from the websocket of newer wifi firmware, instead of polling for live values.  Requires the optional
+aiohttp dependency:
+
+    pip install openevsewifi[async]
+
+The firmware pushes the values of its /status page over ws://host/ws as they change.  PushCharger and
+AsyncPushCharger keep that websocket open, merge the changes into a PushState as they arrive, and answer properties
+from it; properties the websocket does not cover, and every property while it is disconnected, are read from the
+charger as usual.
+"""
+import asyncio
+import base64
+import json
+import threading
+
+from collections import OrderedDict
+from typing import (
+  Callable,
+  Optional
+)
+
+import aiohttp
+
+from openevsewifi import (
+  Charger,
+  PushState
+)
+from openevsewifi.aio import AsyncCharger
+
+
+async def _listen(url: str, headers: dict, state: PushState, reconnect_interval: float,
+                  on_update: Callable[[], None] = None) -> None:
+    """Keeps a websocket open to url, merging its messages into state, and reconnects reconnect_interval seconds
+    after it drops, until cancelled"""
+    # The websocket gets its own session, so that it never holds one of the connections meant for requests.
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.ws_connect(url, headers=headers) as websocket:
+                    state.set_connected(True)
+                    async for message in websocket:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            continue
+                        try:
+                            values = json.loads(message.data)
+                        except ValueError:
+                            continue
+                        if isinstance(values, dict):
+                            state.update(values)
+                            if on_update is not None:
+                                on_update()
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                pass
+            finally:
+                state.set_connected(False)
+            await asyncio.sleep(reconnect_interval)
+
+
+def _authorization(username: Optional[str], password: Optional[str]) -> dict:
+    if not (username and password):
+        return {}
+    return {'Authorization': 'Basic ' + base64.b64encode((username + ':' + password).encode('utf-8')).decode('ascii')}
+
+
+class PushCharger(Charger):
+    def __init__(self, host: str, path: str = '/ws', reconnect_interval: float = 5, **kwargs):
+        """A Charger that keeps a websocket open to the wifi module from a background thread, and answers
+        properties from the values it pushes.  Keyword arguments are passed to Charger.
+
+        Call connect(), or use the charger as a context manager, to open the websocket; close() closes it.  If it
+        drops, it is reopened every reconnect_interval seconds, and properties are read from the charger meanwhile."""
+        super().__init__(host, **kwargs)
+        self.push_state = PushState()
+        self._ws_url = 'ws://' + host + path
+        self._reconnect_interval = reconnect_interval
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def connect(self) -> None:
+        """Opens the websocket, if it is not open already"""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(_listen(self._ws_url, _authorization(self._username, self._password),
+                                                    self.push_state, self._reconnect_interval))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def close(self) -> None:
+        """Closes the websocket and any connections held open to the charger"""
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._thread.join()
+            self._thread = None
+        super().close()
+
+    def wait_for_update(self, timeout: float = None) -> bool:
+        """Blocks until the next message arrives on the websocket, and returns False if timeout seconds pass first"""
+        return self.push_state.wait(self.push_state.updates + 1, timeout)
+
+    def _query(self, command: str) -> tuple:
+        record = self.push_state.record(command)
+        if record is not None:
+            return record
+        return super()._query(command)
+
+    def _query_many(self, commands) -> dict:
+        commands = list(OrderedDict.fromkeys(commands))
+        pushed = {}
+        for command in commands:
+            record = self.push_state.record(command)
+            if record is not None:
+                pushed[command] = record
+        pulled = super()._query_many(command for command in commands if command not in pushed)
+        return {command: pushed[command] if command in pushed else pulled[command] for command in commands}
+
+
+class AsyncPushCharger(AsyncCharger):
+    def __init__(self, host: str, path: str = '/ws', reconnect_interval: float = 5, **kwargs):
+        """An AsyncCharger that keeps a websocket open to the wifi module, and answers properties from the values it
+        pushes.  Keyword arguments are passed to AsyncCharger.
+
+        Call connect(), or use the charger as an async context manager, to open the websocket; close() closes it.
+        If it drops, it is reopened every reconnect_interval seconds, and properties are read from the charger
+        meanwhile."""
+        super().__init__(host, **kwargs)
+        self.push_state = PushState()
+        self._ws_url = 'ws://' + host + path
+        self._ws_headers = dict(self._headers)
+        self._reconnect_interval = reconnect_interval
+        self._task = None
+        self._updated = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def connect(self) -> None:
+        """Opens the websocket, if it is not open already"""
+        if self._task is not None:
+            return
+        self._updated = asyncio.Event()
+        self._task = asyncio.ensure_future(_listen(self._ws_url, self._ws_headers, self.push_state,
+                                                   self._reconnect_interval, self._updated.set))
+
+    async def close(self) -> None:
+        """Closes the websocket and any connections held open to the charger"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().close()
+
+    async def wait_for_update(self, timeout: float = None) -> bool:
+        """Waits for the next message to arrive on the websocket, and returns False if timeout seconds pass first.
+        Raises RuntimeError if connect() has not been called."""
+        if self._updated is None:
+            raise RuntimeError('AsyncPushCharger.connect() must be called before wait_for_update()')
+        self._updated.clear()
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _query(self, command: str) -> tuple:
+        record = self.push_state.record(command)
+        if record is not None:
+            return record
+        return await super()._query(command)
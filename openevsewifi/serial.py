@@ -0,0 +1,204 @@
+"""
+Talks RAPI to the EVSE directly over its serial port, without the wifi module.  Requires the optional pyserial
+dependency:
+
+    pip install openevsewifi[serial]
+"""
+import threading
+import time
+
+from functools import reduce
+from typing import (
+  Iterable,
+  List,
+  Union
+)
+
+import serial
+
+from openevsewifi import (
+  BadChecksum,
+  BadResponse,
+  Charger,
+  ChargerOffline,
+  CommandResult,
+  _command_name,
+  _transient_errors,
+  parse_checksum
+)
+
+
+class SerialTimeout(Exception):
+    """Raised when the EVSE does not answer a command on the serial port in time"""
+    pass
+
+
+def _with_checksum(command: str) -> str:
+    return '%s^%02X' % (command, reduce(lambda datsum, c: datsum ^ c, command.encode('utf-8'), 0))
+
+
+class SerialCharger(Charger):
+    _transient_errors = _transient_errors + (SerialTimeout, serial.SerialException)
+
+    def __init__(self, port: str, baudrate: int = 115200, timeout: float = 1, pipeline_depth: int = 8,
+                 sequence_ids: bool = False, serial_port: serial.SerialBase = None, **kwargs):
+        """A connection to an OpenEVSE charging station over the RAPI serial port, such as '/dev/ttyUSB0' or any URL
+        pyserial accepts.  Keyword arguments are passed to Charger, whose properties, setters, retries, breaker and
+        cache all work the same way.
+
+        Commands are sent with a ^xx checksum, and every response's checksum is checked with parse_checksum.
+        Commands with no answer within timeout seconds raise SerialTimeout.  batch(), snapshot() and read() pipeline
+        their commands, writing up to pipeline_depth of them before reading the answers, which the EVSE sends in
+        order.  With sequence_ids=True, which needs RAPI 4 or later, each command carries a :xx sequence id, and
+        answers to earlier, timed out commands are recognised and dropped.  Pass an open serial_port to configure
+        the port yourself."""
+        kwargs.setdefault('bulk', False)
+        super().__init__(port, **kwargs)
+        self._serial = serial_port or serial.serial_for_url(port, baudrate=baudrate, timeout=timeout)
+        self._pipeline_depth = max(1, pipeline_depth)
+        self._sequence_ids = sequence_ids
+        self._sequence = 0
+        self._serial_lock = threading.Lock()
+
+    def _flavour(self) -> str:
+        return 'serial'
+
+    def close(self) -> None:
+        """Closes the serial port"""
+        super().close()
+        self._serial.close()
+
+    def _post(self, command: str) -> List[str]:
+        [result] = self._exchange([command])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _exchange(self, commands: List[str]) -> List[Union[List[str], Exception]]:
+        """Sends commands, pipeline_depth at a time, and returns the parsed answer to each, or the exception it
+        failed with"""
+        results = []
+        with self._serial_lock:
+            for start in range(0, len(commands), self._pipeline_depth):
+                chunk = commands[start:start + self._pipeline_depth]
+                tags = []
+                lines = []
+                for command in chunk:
+                    tag = None
+                    if self._sequence_ids:
+                        self._sequence = self._sequence % 255 + 1
+                        tag = ':%02X' % self._sequence
+                        command = command + ' ' + tag
+                    tags.append(tag)
+                    lines.append(_with_checksum(command) + '\r')
+                sent = time.perf_counter()
+                self._serial.write(''.join(lines).encode('utf-8'))
+                for command, tag in zip(chunk, tags):
+                    try:
+                        response = self._read_response(tag)
+                    except SerialTimeout as error:
+                        self._drain()
+                        for unanswered in chunk[len(results) - start:]:
+                            self._report_error(unanswered, error)
+                            results.append(error)
+                        break
+                    except (BadChecksum, BadResponse) as error:
+                        self._report_error(command, error)
+                        results.append(error)
+                    else:
+                        if self._instrumentation is not None:
+                            self._instrumentation.on_response(self._host, _command_name(command),
+                                                              time.perf_counter() - sent, 0)
+                        results.append(response)
+        return results
+
+    def _drain(self) -> None:
+        """Discards input until the line has been quiet for timeout seconds, as a late answer would otherwise be
+        taken for the answer to the next command"""
+        self._serial.reset_input_buffer()
+        if self._sequence_ids:
+            # Late answers carry a sequence id that no later command uses, and are dropped as they arrive.
+            return
+        while self._serial.read(1):
+            self._serial.reset_input_buffer()
+
+    def _report_error(self, command: str, error: Exception) -> None:
+        if self._instrumentation is not None:
+            self._instrumentation.on_error(self._host, _command_name(command), error)
+
+    def _read_response(self, tag: str = None) -> List[str]:
+        """Reads lines until the answer to a command arrives, skipping the EVSE's unsolicited messages, and answers
+        tagged with another sequence id"""
+        while True:
+            line = self._serial.read_until(b'\r')
+            if not line.endswith(b'\r'):
+                raise SerialTimeout
+            line = line.decode('utf-8', 'replace').strip()
+            if not (line.startswith('$OK') or line.startswith('$NK')):
+                continue
+            words = parse_checksum(line)[1:].split()
+            if tag is not None:
+                if not words or words[-1] != tag:
+                    continue
+                words.pop()
+            elif words and words[-1].startswith(':'):
+                words.pop()
+            return words
+
+    def _send_pipelined(self, commands: List[str]) -> List[Union[List[str], Exception]]:
+        """Exchanges commands through the request limiter and the circuit breaker, which counts the whole exchange
+        as one request"""
+        if not commands:
+            return []
+        self._before_request(_command_name(commands[0]))
+        try:
+            with self._limiter:
+                results = self._exchange(commands)
+        except self._transient_errors as error:
+            # The port itself failed, so no answer read before the error can be relied on either.
+            results = [error] * len(commands)
+        if self._breaker is not None:
+            if any(isinstance(result, self._transient_errors) for result in results):
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_success()
+        return results
+
+    def batch(self, commands: Iterable[str]) -> List[CommandResult]:
+        """Sends several RAPI commands pipelined, and returns a CommandResult for each, in order.  A command that
+        fails does not stop the ones after it.  Commands that fail with a transient error, such as SerialTimeout,
+        are sent again one at a time, with the usual retries.  Setter commands clear the cached responses they
+        change."""
+        commands = list(commands)
+        try:
+            answers = self._send_pipelined(commands)
+        except ChargerOffline as error:
+            return [CommandResult(command, None, error) for command in commands]
+        results = []
+        for command, answer in zip(commands, answers):
+            if isinstance(answer, self._transient_errors):
+                try:
+                    answer = self._send_command(command)
+                except Exception as error:
+                    answer = error
+            self._invalidate_for(command)
+            if isinstance(answer, Exception):
+                results.append(CommandResult(command, None, answer))
+            else:
+                results.append(CommandResult(command, answer, None))
+        return results
+
+    def _fetch_many(self, commands: List[str]) -> dict:
+        if len(commands) <= 1:
+            return super()._fetch_many(commands)
+        send = [command for command in commands if command not in self._unsupported]
+        answers = dict(zip(send, self._send_pipelined(send)))
+        records = {}
+        for command in commands:
+            answer = answers.get(command)
+            if isinstance(answer, Exception):
+                # Go through the usual path, with its retries and circuit breaker.
+                records[command] = self._fetch(command)
+            else:
+                records[command] = self._decode(command, answer)
+        return records
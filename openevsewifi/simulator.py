@@ -0,0 +1,504 @@
+"""
+A simulated OpenEVSE wifi module, for load and latency testing without a physical charger.
+
+Each ChargerSimulator serves RAPI commands over HTTP on localhost, answering the JSON flavour at /r?json=1& and the
+HTML flavour at /r?, with valid ^xx checksums, as well as the JSON /status and /config pages of newer firmware and
+its /ws websocket, which pushes changes to the /status values.  Run a few hundred of them with SimulatorFleet, or
+from the command line:
+
+    python -m openevsewifi.simulator --count 10 --latency 0.05
+
+SerialSimulator answers the same commands on a pseudo-terminal instead, like the EVSE's own serial port.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import select
+import struct
+import threading
+import time
+
+from functools import reduce
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import (
+  List,
+  Sequence,
+  Tuple
+)
+from urllib.parse import parse_qs, urlsplit
+
+# Appended to the client's key to accept a websocket handshake, per RFC 6455.
+_websocket_guid = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def _with_checksum(response: str) -> str:
+    return '%s^%02X' % (response, reduce(lambda datsum, c: datsum ^ c, response.encode('utf-8'), 0))
+
+
+def _frame(opcode: int, payload: bytes) -> bytes:
+    """Returns an unmasked, unfragmented websocket frame, as sent by a server"""
+    if len(payload) < 126:
+        header = struct.pack('!BB', 0x80 | opcode, len(payload))
+    elif len(payload) < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, len(payload))
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, len(payload))
+    return header + payload
+
+
+class SimulatedCharger:
+    """The state of one simulated charger.
+
+    The charger steps through cycle, a sequence of (state, seconds) pairs using the RAPI state numbers, forever,
+    unless it has been disabled or put to sleep.  While charging it draws its current capacity at voltage volts, and
+    its energy counters go up accordingly."""
+    default_cycle = ((1, 30), (2, 10), (3, 120))
+
+    def __init__(self, cycle: Sequence[Tuple[int, float]] = default_cycle, current_capacity: int = 32,
+                 voltage: float = 240, firmware_version: str = '5.1.2', protocol_version: str = '4.0.1',
+                 clock=time.monotonic):
+        self.cycle = tuple(cycle)
+        self.current_capacity = current_capacity
+        self.min_amps = 6
+        self.max_amps = 80
+        self.flags = 0x0221
+        self.voltage = voltage
+        self.firmware_version = firmware_version
+        self.protocol_version = protocol_version
+        self.temperatures = (250, 240, 0)
+        self.fault_counts = (0, 0, 0)
+        self.time_limit = 0
+        self.charge_limit = 0
+        self.session_wattseconds = 0.0
+        self.total_wh = 0.0
+        self._clock = clock
+        self._started = clock()
+        self._updated = self._started
+        self._charging_since = None
+        self._override = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> int:
+        """Returns the RAPI state number the charger is in at the current time"""
+        if self._override is not None:
+            return self._override
+        elapsed = (self._clock() - self._started) % sum(seconds for _, seconds in self.cycle)
+        for state, seconds in self.cycle:
+            if elapsed < seconds:
+                return state
+            elapsed -= seconds
+        return self.cycle[-1][0]
+
+    def _update(self) -> int:
+        now = self._clock()
+        state = self.state
+        if state == 3:
+            if self._charging_since is None:
+                self._charging_since = now
+                self.session_wattseconds = 0.0
+            wattseconds = self.current_capacity * self.voltage * (now - self._updated)
+            self.session_wattseconds += wattseconds
+            self.total_wh += wattseconds / 3600
+        else:
+            self._charging_since = None
+        self._updated = now
+        return state
+
+    def respond(self, command: str) -> str:
+        """Returns the RAPI response to command, without a checksum"""
+        with self._lock:
+            state = self._update()
+            name = command.split()[0] if command.split() else ''
+            arguments = command.split()[1:]
+            if name == '$SC' and len(arguments) == 1 and self.min_amps <= int(arguments[0]) <= self.max_amps:
+                self.current_capacity = int(arguments[0])
+                return '$OK'
+            if name in ('$FE', '$FD', '$FS'):
+                self._override = {'$FE': None, '$FD': 255, '$FS': 254}[name]
+                return '$OK'
+            if name == '$S3' and len(arguments) == 1:
+                self.time_limit = int(arguments[0])
+                return '$OK'
+            if name == '$SH' and len(arguments) == 1:
+                self.charge_limit = int(arguments[0])
+                return '$OK'
+            if name == '$S1' and len(arguments) == 6:
+                return '$OK'
+            if name == '$GS':
+                elapsed = int(self._clock() - self._charging_since) if self._charging_since is not None else 0
+                return '$OK %d %d' % (state, elapsed)
+            if name == '$GG':
+                if state == 3:
+                    return '$OK %d %d' % (self.current_capacity * 1000, self.voltage * 1000)
+                return '$OK 0 %d' % (self.voltage * 1000)
+            if name == '$GU':
+                return '$OK %d %d' % (self.session_wattseconds, self.total_wh)
+            if name == '$GE':
+                return '$OK %d %04x' % (self.current_capacity, self.flags)
+            if name == '$GC':
+                return '$OK %d %d' % (self.min_amps, self.max_amps)
+            if name == '$GA':
+                return '$OK 220 0'
+            if name == '$GF':
+                return '$OK %d %d %d' % self.fault_counts
+            if name == '$GP':
+                return '$OK %d %d %d' % self.temperatures
+            if name == '$G3':
+                return '$OK %d' % self.time_limit
+            if name == '$GH':
+                return '$OK %d' % self.charge_limit
+            if name == '$GT':
+                now = time.localtime()
+                return '$OK %d %d %d %d %d %d' % (now.tm_year - 2000, now.tm_mon, now.tm_mday,
+                                                  now.tm_hour, now.tm_min, now.tm_sec)
+            if name == '$GV':
+                return '$OK %s %s' % (self.firmware_version, self.protocol_version)
+            return '$NK'
+
+    def status_page(self) -> dict:
+        """Returns the live values served at /status"""
+        with self._lock:
+            state = self._update()
+            elapsed = int(self._clock() - self._charging_since) if self._charging_since is not None else 0
+            return {
+                'state': state,
+                'elapsed': elapsed,
+                'amp': self.current_capacity * 1000 if state == 3 else 0,
+                'voltage': self.voltage,
+                'pilot': self.current_capacity,
+                'temp1': self.temperatures[0],
+                'temp2': self.temperatures[1],
+                'temp3': self.temperatures[2],
+                'wattsec': int(self.session_wattseconds),
+                'watthour': int(self.total_wh),
+                'gfcicount': self.fault_counts[0],
+                'nogndcount': self.fault_counts[1],
+                'stuckcount': self.fault_counts[2],
+            }
+
+    def config_page(self) -> dict:
+        """Returns the versions and settings served at /config.  Like the real firmware, it does not report the
+        protocol version."""
+        with self._lock:
+            return {
+                'firmware': self.firmware_version,
+                'protocol': '-',
+                'scale': 220,
+                'offset': 0,
+                'min_current_hard': self.min_amps,
+                'max_current_hard': self.max_amps,
+            }
+
+
+class _SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path in ('/status', '/config'):
+            return self._page(url.path)
+        if url.path == '/ws':
+            return self._websocket()
+        self._handle(url.query)
+
+    def do_POST(self):
+        self._handle(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+
+    def _handle(self, form: str):
+        simulator = self.server.simulator
+        url = urlsplit(self.path)
+        if url.path != '/r':
+            return self._send(404, 'text/plain', 'Not found')
+        if simulator.latency:
+            time.sleep(simulator.latency)
+        if simulator.credentials is not None and self.headers.get('Authorization') != simulator.credentials:
+            return self._send(401, 'text/plain', 'Unauthorized')
+        if simulator.error_rate and random.random() < simulator.error_rate:
+            return self._send(500, 'text/plain', 'Internal error')
+        command = parse_qs(form).get('rapi', parse_qs(url.query).get('rapi', ['']))[0]
+        response = _with_checksum(simulator.charger.respond(command))
+        if simulator.corrupt_rate and random.random() < simulator.corrupt_rate:
+            response = response[:-2] + ('00' if response[-2:] != '00' else '01')
+        if 'json=1' in url.query:
+            self._send(200, 'application/json', json.dumps({'cmd': command, 'ret': response}))
+        else:
+            self._send(200, 'text/html', '<html><p>RAPI Command Sent<p>%s<p>&gt;%s<script>'
+                                         'window.location.href=\'/\'</script></html>' % (command, response))
+
+    def _page(self, path: str):
+        simulator = self.server.simulator
+        if not simulator.bulk_pages:
+            return self._send(404, 'text/plain', 'Not found')
+        if simulator.latency:
+            time.sleep(simulator.latency)
+        if simulator.credentials is not None and self.headers.get('Authorization') != simulator.credentials:
+            return self._send(401, 'text/plain', 'Unauthorized')
+        page = simulator.charger.status_page() if path == '/status' else simulator.charger.config_page()
+        self._send(200, 'application/json', json.dumps(page))
+
+    def _websocket(self):
+        simulator = self.server.simulator
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not simulator.bulk_pages:
+            return self._send(404, 'text/plain', 'Not found')
+        if self.headers.get('Upgrade', '').lower() != 'websocket' or not key:
+            return self._send(400, 'text/plain', 'Expected a websocket handshake')
+        if simulator.credentials is not None and self.headers.get('Authorization') != simulator.credentials:
+            return self._send(401, 'text/plain', 'Unauthorized')
+        accept = base64.b64encode(hashlib.sha1((key + _websocket_guid).encode('ascii')).digest()).decode('ascii')
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        self.close_connection = True
+        closed = threading.Event()
+        lock = threading.Lock()
+        threading.Thread(target=self._read_frames, args=(closed, lock), daemon=True).start()
+        # Like the firmware, send every value on connection, then only the values that change.
+        last = {}
+        while not closed.is_set() and not simulator.stopping.is_set():
+            page = simulator.charger.status_page()
+            changes = {name: value for name, value in page.items() if last.get(name) != value}
+            if changes:
+                try:
+                    with lock:
+                        self.wfile.write(_frame(0x1, json.dumps(changes).encode('utf-8')))
+                except OSError:
+                    break
+                last = page
+            closed.wait(simulator.push_interval)
+
+    def _read_frames(self, closed: threading.Event, lock: threading.Lock):
+        """Answers the client's pings and close frame until the connection ends"""
+        try:
+            while True:
+                header = self.rfile.read(2)
+                if len(header) < 2:
+                    break
+                opcode = header[0] & 0x0f
+                length = header[1] & 0x7f
+                if length == 126:
+                    length = struct.unpack('!H', self.rfile.read(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', self.rfile.read(8))[0]
+                mask = self.rfile.read(4) if header[1] & 0x80 else bytes(4)
+                payload = bytes(c ^ mask[i % 4] for i, c in enumerate(self.rfile.read(length)))
+                if opcode == 0x8:
+                    with lock:
+                        self.wfile.write(_frame(0x8, payload[:2]))
+                    break
+                if opcode == 0x9:
+                    with lock:
+                        self.wfile.write(_frame(0xa, payload))
+        except (OSError, ValueError):
+            pass
+        finally:
+            closed.set()
+
+    def _send(self, status: int, content_type: str, body: str):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ChargerSimulator:
+    def __init__(self, charger: SimulatedCharger = None, port: int = 0, latency: float = 0, error_rate: float = 0,
+                 corrupt_rate: float = 0, username: str = None, password: str = None, bulk_pages: bool = True,
+                 push_interval: float = 1):
+        """Serves a SimulatedCharger over HTTP on localhost.
+
+        Every request is delayed by latency seconds.  A fraction error_rate of RAPI requests fail with an HTTP 500,
+        and a fraction corrupt_rate of responses carry a bad checksum.  If username and password are given, requests
+        without them are refused with an HTTP 401.  The websocket checks for changes to push every push_interval
+        seconds.  With bulk_pages=False the /status and /config pages and the websocket are missing, as on older
+        firmware."""
+        self.charger = charger or SimulatedCharger()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.corrupt_rate = corrupt_rate
+        self.bulk_pages = bulk_pages
+        self.push_interval = push_interval
+        self.stopping = threading.Event()
+        if username and password:
+            self.credentials = 'Basic ' + base64.b64encode((username + ':' + password).encode('utf-8')).decode()
+        else:
+            self.credentials = None
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _SimulatorHandler)
+        self._server.daemon_threads = True
+        self._server.simulator = self
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        """Returns the host:port to pass to Charger"""
+        return '127.0.0.1:%d' % self._server.server_port
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> None:
+        """Starts serving requests from a background thread"""
+        self.stopping.clear()
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.1,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops serving requests, ends any websocket connections and releases the port"""
+        self.stopping.set()
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+
+class SerialSimulator:
+    def __init__(self, charger: SimulatedCharger = None, latency: float = 0, delays: dict = None):
+        """Answers RAPI commands for a SimulatedCharger on a pseudo-terminal, the way the EVSE answers on its serial
+        port.  Open port with SerialCharger.  POSIX only.
+
+        Each command line ends in a carriage return, and may carry a ^xx checksum, which is checked, and a :xx
+        sequence id, which is echoed.  Commands are answered in order, each after latency seconds, or after the
+        delay given for it in delays, such as {'$GV': 0.5}."""
+        import tty
+        self.charger = charger or SimulatedCharger()
+        self.latency = latency
+        self.delays = dict(delays or {})
+        self.received = []
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> None:
+        """Starts answering commands from a background thread"""
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops answering commands and closes the pseudo-terminal"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        os.close(self._master)
+        os.close(self._slave)
+
+    def notify(self, message: str) -> None:
+        """Sends an unsolicited message, such as '$ST 03', as the EVSE does when its state changes"""
+        self._write(_with_checksum(message))
+
+    def _write(self, line: str) -> None:
+        with self._write_lock:
+            os.write(self._master, (line + '\r').encode('utf-8'))
+
+    def _serve(self) -> None:
+        pending = b''
+        while not self._stopping.is_set():
+            if not select.select([self._master], [], [], 0.1)[0]:
+                continue
+            try:
+                pending += os.read(self._master, 4096)
+            except OSError:
+                break
+            *lines, pending = pending.split(b'\r')
+            for line in lines:
+                self._answer(line.decode('utf-8', 'replace').strip())
+
+    def _answer(self, line: str) -> None:
+        if not line:
+            return
+        self.received.append(line)
+        command, sep, checksum = line.rpartition('^')
+        if not sep:
+            command = line
+        elif _with_checksum(command) != line:
+            return self._write(_with_checksum('$NK'))
+        words = command.split()
+        sequence = words.pop() if words and words[-1].startswith(':') else None
+        delay = self.delays.get(words[0], self.latency) if words else self.latency
+        if delay:
+            time.sleep(delay)
+        response = self.charger.respond(' '.join(words))
+        if sequence is not None:
+            response += ' ' + sequence
+        self._write(_with_checksum(response))
+
+
+class SimulatorFleet:
+    def __init__(self, count: int, **kwargs):
+        """Runs count ChargerSimulators, each on its own port.  Keyword arguments are passed to every simulator."""
+        self.simulators = [ChargerSimulator(**kwargs) for _ in range(count)]
+
+    @property
+    def hosts(self) -> List[str]:
+        """Returns the host:port of every simulator"""
+        return [simulator.host for simulator in self.simulators]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> None:
+        for simulator in self.simulators:
+            simulator.start()
+
+    def stop(self) -> None:
+        for simulator in self.simulators:
+            simulator.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve simulated OpenEVSE wifi modules on localhost.')
+    parser.add_argument('--count', type=int, default=1, help='number of simulated chargers')
+    parser.add_argument('--port', type=int, default=0, help='port of the first charger, or 0 for any free ports')
+    parser.add_argument('--latency', type=float, default=0, help='seconds to delay every response')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--corrupt-rate', type=float, default=0, help='fraction of responses with bad checksums')
+    args = parser.parse_args(argv)
+    simulators = [ChargerSimulator(port=args.port + i if args.port else 0, latency=args.latency,
+                                   error_rate=args.error_rate, corrupt_rate=args.corrupt_rate)
+                  for i in range(args.count)]
+    for simulator in simulators:
+        simulator.start()
+        print(simulator.host)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
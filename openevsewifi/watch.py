@@ -0,0 +1,105 @@
+"""
+Change notifications for Charger properties, built on polling.
+"""
+import logging
+import threading
+import time
+
+from typing import (
+  Any,
+  Callable,
+  List,
+  NamedTuple
+)
+
+from openevsewifi import (
+  Charger,
+  ChargerOffline,
+  _ReplayCharger,
+  _property_commands
+)
+
+_logger = logging.getLogger(__name__)
+
+Change = NamedTuple('Change', [('name', str), ('old', Any), ('new', Any)])
+Change.__doc__ = """A change in the value of a Charger property.  old is None the first time a property is read"""
+
+_unset = object()
+
+
+class _Subscription:
+    __slots__ = ('name', 'callback', 'deadband', 'last')
+
+    def __init__(self, name: str, callback: Callable[[Change], Any], deadband: float):
+        self.name = name
+        self.callback = callback
+        self.deadband = deadband
+        self.last = _unset
+
+    def changed(self, value) -> bool:
+        if self.last is _unset:
+            return True
+        if self.deadband and isinstance(value, (int, float)) and isinstance(self.last, (int, float)):
+            return abs(value - self.last) > self.deadband
+        return value != self.last
+
+
+class ChargerWatcher:
+    def __init__(self, charger: Charger):
+        """Polls the properties subscribed to on a charger, and calls the subscribers only when values change."""
+        self._charger = charger
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, name: str, callback: Callable[[Change], Any], deadband: float = 0) -> None:
+        """Calls callback with a Change whenever the named property changes.  Numeric properties must move by more
+        than deadband from the last value reported to this callback to count as a change.  To receive changes on a
+        queue, subscribe its put method."""
+        if name not in _property_commands:
+            raise ValueError('Unknown property: ' + name)
+        with self._lock:
+            self._subscriptions.append(_Subscription(name, callback, deadband))
+
+    def unsubscribe(self, name: str, callback: Callable[[Change], Any]) -> None:
+        """Stops calling callback for changes to the named property"""
+        with self._lock:
+            self._subscriptions = [subscription for subscription in self._subscriptions
+                                   if subscription.name != name or subscription.callback != callback]
+
+    def poll(self) -> List[Change]:
+        """Reads every subscribed property once, sending each distinct RAPI command only one time, notifies the
+        subscribers of any changes and returns them.  A subscriber that raises is logged, and does not stop the
+        others being notified."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        commands = (_property_commands[subscription.name] for subscription in subscriptions)
+        replay = _ReplayCharger(self._charger._query_many(commands))
+        values = {}
+        changes = []
+        for subscription in subscriptions:
+            if subscription.name not in values:
+                values[subscription.name] = getattr(replay, subscription.name)
+            value = values[subscription.name]
+            if subscription.changed(value):
+                old = None if subscription.last is _unset else subscription.last
+                subscription.last = value
+                change = Change(subscription.name, old, value)
+                try:
+                    subscription.callback(change)
+                except Exception:
+                    _logger.exception('Subscriber to %s failed on %r', subscription.name, change)
+                changes.append(change)
+        return changes
+
+    def run(self, interval: float = 1, stop: threading.Event = None) -> None:
+        """Polls every interval seconds until stop is set, or forever if no event is given.  Transient errors, such
+        as timeouts, are logged and the next poll goes ahead; other errors, such as InvalidAuthentication, end the
+        loop."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll()
+            except self._charger._transient_errors + (ChargerOffline,) as error:
+                _logger.warning('Polling %s failed: %r', self._charger._host, error)
+            stop.wait(max(0, interval - (time.monotonic() - started)))
@@ -10,3 +10,16 @@ def test_charger():
 @pytest.fixture
 def test_charger_json():
     return openevsewifi.Charger('openevse.example.tld', json=True)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from tests.utils import rapi_app
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from openevsewifi import InvalidAuthentication  # noqa: E402
+from openevsewifi.aio import AsyncCharger  # noqa: E402
+
+V3_FIXTURES = {
+    '$GS': 'v3_responses/status_connected.txt',
+    '$G3': 'v3_responses/time_limit_set.txt',
+    '$GA': 'v3_responses/ammeter.txt',
+    '$GC': 'v3_responses/capacity_range.txt',
+    '$GE': 'v3_responses/settings.txt',
+    '$GF': 'v3_responses/faults.txt',
+    '$GG': 'v3_responses/charging_values_charging.txt',
+    '$GH': 'v3_responses/charge_limit.txt',
+    '$GM': 'v3_responses/voltmeter_settings.txt',
+    '$GO': 'v3_responses/temperature_settings.txt',
+    '$GP': 'v3_responses/temperature_values.txt',
+    '$GT': 'v3_responses/time.txt',
+    '$GU': 'v3_responses/usage_plugged.txt',
+    '$GV': 'v3_responses/version.txt',
+}
+
+
+def run_with_server(test, fixtures=V3_FIXTURES, status=200):
+    """Run the coroutine function test against a local server answering RAPI commands from fixtures."""
+    received = []
+
+    async def main():
+        async with TestServer(rapi_app(fixtures, status=status, received=received)) as server:
+            await test('%s:%d' % (server.host, server.port))
+    asyncio.run(main())
+    return received
+
+
+def test_status():
+    async def test(host):
+        async with AsyncCharger(host, json=True) as charger:
+            assert await charger.status() == 'connected'
+            assert await charger.charge_time_elapsed() == 0
+    assert run_with_server(test) == ['$GS', '$GS']
+
+
+def test_properties_match_fixtures():
+    async def test(host):
+        async with AsyncCharger(host, json=True) as charger:
+            assert await charger.current_capacity() == 30
+            assert await charger.service_level() == 2
+            assert await charger.max_amps() == 80
+            assert await charger.ambient_threshold() == 0.0
+            assert await charger.firmware_version() == '5.0.1'
+    run_with_server(test)
+
+
+def test_snapshot_sends_each_command_once():
+    async def test(host):
+        async with AsyncCharger(host, json=True) as charger:
+            snapshot = await charger.snapshot()
+        assert snapshot.status == 'connected'
+        assert snapshot.charging_current == 10.34
+        assert snapshot.protocol_version == '4.0.1'
+    requests = run_with_server(test)
+    assert sorted(requests) == sorted(V3_FIXTURES)
+
+
+def test_html_responses():
+    async def test(host):
+        async with AsyncCharger(host) as charger:
+            assert await charger.status() == 'charging'
+    run_with_server(test, fixtures={'$GS': 'v1_responses/status_charging.txt'})
+
+
+def test_auth_failure_raises_exception():
+    async def test(host):
+        async with AsyncCharger(host, json=True, username='user', password='wrong') as charger:
+            with pytest.raises(InvalidAuthentication):
+                await charger.status()
+    run_with_server(test, status=401)
+
+
+def test_shared_session_left_open():
+    async def test(host):
+        async with aiohttp.ClientSession() as session:
+            charger = AsyncCharger(host, json=True, session=session)
+            await charger.status()
+            await charger.close()
+            assert not session.closed
+    run_with_server(test)
+
+
+def test_telemetry():
+    async def test(host):
+        async with AsyncCharger(host, json=True) as charger:
+            samples = []
+            async for sample in charger.telemetry(interval=0.01):
+                samples.append(sample)
+                if len(samples) == 2:
+                    break
+        assert [sample.status for sample in samples] == ['connected', 'connected']
+        assert samples[0].charging_current == 10.34
+        assert samples[0].ambient_temperature == 57.0
+        assert samples[1].timestamp >= samples[0].timestamp
+    assert sorted(run_with_server(test)) == ['$GG', '$GG', '$GP', '$GP', '$GS', '$GS', '$GU', '$GU']
+
+
+def test_instrumentation():
+    from openevsewifi.metrics import MetricsCollector
+    metrics = MetricsCollector()
+
+    async def test(host):
+        async with AsyncCharger(host, json=True, instrumentation=metrics) as charger:
+            await charger.status()
+            await charger.firmware_version()
+        assert metrics.requests[(host, '$GS')] == 1
+        assert metrics.network_seconds[(host, '$GV')].count == 1
+    run_with_server(test)
+
+
+def test_limiter_serializes_requests():
+    import time
+    from openevsewifi import RequestLimiter
+
+    async def main():
+        async with TestServer(rapi_app(V3_FIXTURES, delay=0.05)) as server:
+            host = '%s:%d' % (server.host, server.port)
+            async with AsyncCharger(host, json=True, pool_size=4, limiter=RequestLimiter(1)) as charger:
+                started = time.monotonic()
+                await asyncio.gather(*(charger.status() for _ in range(4)))
+                return time.monotonic() - started
+    assert asyncio.run(main()) >= 0.2
+
+
+def test_limiter_shared_with_threads():
+    import threading
+    from openevsewifi import RequestLimiter
+    limiter = RequestLimiter(1)
+    limiter.acquire()
+
+    async def main():
+        threading.Timer(0.05, limiter.release).start()
+        await asyncio.wait_for(limiter.acquire_async(), 1)
+        limiter.release()
+    asyncio.run(main())
+    assert limiter._in_flight == 0
+
+
+def test_limiter_drops_cancelled_waiters():
+    from openevsewifi import RequestLimiter
+    limiter = RequestLimiter(1)
+    limiter.acquire()
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire_async(), 0.05)
+    asyncio.run(main())
+    assert limiter._waiters == []
+    limiter.release()
+    limiter.acquire()
+    limiter.release()
+
+
+def test_limiter_skips_waiters_on_closed_loops():
+    from openevsewifi import RequestLimiter
+    limiter = RequestLimiter(1)
+    limiter.acquire()
+    loop = asyncio.new_event_loop()
+    limiter._waiters.append((loop, loop.create_future()))
+    loop.close()
+    limiter.release()
+    assert limiter._in_flight == 0
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+import openevsewifi
+from openevsewifi.balancer import LoadBalancer, allocate
+from openevsewifi.simulator import ChargerSimulator, SimulatedCharger
+
+
+@pytest.mark.parametrize('ranges, budget, expected',
+                         [([(6, 32), (6, 16), (6, 80)], 60, [22, 16, 22]),
+                          ([(6, 32), (6, 16), (6, 80)], 200, [32, 16, 80]),
+                          ([(6, 32), (6, 16), (6, 80)], 14, [7, 7, 0]),
+                          ([(6, 32), (6, 16)], 5, [0, 0]),
+                          ([(10, 10), (6, 40)], 30, [10, 20]),
+                          ([(6, 32), (6, 32), (6, 32)], 50, [17, 17, 16]),
+                          ([], 30, [])])
+def test_allocate(ranges, budget, expected):
+    assert allocate(ranges, budget) == expected
+
+
+def test_allocate_many_units():
+    generator = random.Random(1)
+    ranges = [(6, generator.randint(6, 80)) for _ in range(500)]
+    amps = allocate(ranges, 8000)
+    assert sum(amps) == 8000
+    assert all(low <= allocated <= high for (low, high), allocated in zip(ranges, amps))
+    unsaturated = [allocated for (_, high), allocated in zip(ranges, amps) if allocated < high]
+    assert max(unsaturated) - min(unsaturated) <= 1
+
+
+@pytest.fixture
+def simulators():
+    cycles = [((3, 1000),), ((3, 1000),), ((2, 1000),), ((1, 1000),)]
+    simulators = [ChargerSimulator(SimulatedCharger(cycle=cycle, current_capacity=32)) for cycle in cycles]
+    for simulator in simulators:
+        simulator.start()
+    yield simulators
+    for simulator in simulators:
+        simulator.stop()
+
+
+def test_apply_sets_only_changed_capacities(simulators, monkeypatch):
+    chargers = [openevsewifi.Charger(simulator.host, json=True) for simulator in simulators]
+    allocations = LoadBalancer(chargers, budget=80).apply()
+    assert [allocation.status for allocation in allocations] == ['charging', 'charging', 'connected', 'not connected']
+    assert [allocation.amps for allocation in allocations] == [27, 27, 26, None]
+    assert [simulator.charger.current_capacity for simulator in simulators] == [27, 27, 26, 32]
+
+    simulators[1].charger.current_capacity = 20
+    changed = []
+    monkeypatch.setattr(openevsewifi.Charger, 'set_current_capacity',
+                        lambda charger, amps, defer=False: changed.append((charger, amps)))
+    LoadBalancer(chargers, budget=80).apply()
+    assert changed == [(chargers[1], 27)]
+
+
+def test_headroom_limits_vehicles_drawing_less(simulators):
+    chargers = [openevsewifi.Charger(simulator.host, json=True) for simulator in simulators]
+    simulators[0].charger.current_capacity = 10
+    allocations = LoadBalancer(chargers, budget=80, headroom=2).plan()
+    assert [allocation.amps for allocation in allocations] == [12, 34, 34, None]
+
+
+def test_apply_decreases_before_increases(simulators, monkeypatch):
+    chargers = [openevsewifi.Charger(simulator.host, json=True) for simulator in simulators]
+    simulators[0].charger.current_capacity = 10
+    calls = []
+    set_current_capacity = openevsewifi.Charger.set_current_capacity
+
+    def record(charger, amps, defer=False):
+        calls.append((chargers.index(charger), amps))
+        set_current_capacity(charger, amps, defer)
+    monkeypatch.setattr(openevsewifi.Charger, 'set_current_capacity', record)
+    LoadBalancer(chargers, budget=60).apply()
+    assert calls == [(1, 20), (2, 20), (0, 20)]
+
+
+def test_apply_pauses_chargers_the_budget_cannot_cover(simulators):
+    chargers = [openevsewifi.Charger(simulator.host, json=True) for simulator in simulators]
+    balancer = LoadBalancer(chargers, budget=10)
+    assert [allocation.amps for allocation in balancer.apply()] == [10, 0, 0, None]
+    assert [simulator.charger.state for simulator in simulators] == [3, 254, 254, 1]
+    assert [allocation.amps for allocation in balancer.apply()] == [10, 0, 0, None]
+
+    balancer.budget = 80
+    assert [allocation.amps for allocation in balancer.apply()] == [27, 27, 26, None]
+    assert [simulator.charger.state for simulator in simulators] == [3, 3, 2, 1]
+    assert [simulator.charger.current_capacity for simulator in simulators] == [27, 27, 26, 32]
+
+
+def test_unreachable_charger_does_not_stop_balancing(simulators):
+    chargers = [openevsewifi.Charger(simulator.host, json=True) for simulator in simulators[:3]]
+    chargers.append(openevsewifi.Charger('127.0.0.1:9', json=True, retries=0, timeout=1))
+    allocations = LoadBalancer(chargers, budget=80).apply()
+    assert [allocation.amps for allocation in allocations] == [27, 27, 26, None]
+    assert [allocation.error is None for allocation in allocations] == [True, True, True, False]
+    assert isinstance(allocations[3].error, openevsewifi.requests.ConnectionError)
+    assert [simulator.charger.current_capacity for simulator in simulators[:3]] == [27, 27, 26]
+
+
+def test_apply_reports_failed_updates(simulators, monkeypatch):
+    chargers = [openevsewifi.Charger(simulator.host, json=True) for simulator in simulators]
+    set_current_capacity = openevsewifi.Charger.set_current_capacity
+
+    def fail_first(charger, amps, defer=False):
+        if charger is chargers[0]:
+            raise openevsewifi.CommandRejected('$SC %d' % amps)
+        set_current_capacity(charger, amps, defer)
+    monkeypatch.setattr(openevsewifi.Charger, 'set_current_capacity', fail_first)
+    allocations = LoadBalancer(chargers, budget=80).apply()
+    assert isinstance(allocations[0].error, openevsewifi.CommandRejected)
+    assert [allocation.error for allocation in allocations[1:]] == [None, None, None]
+    assert [simulator.charger.current_capacity for simulator in simulators] == [32, 27, 26, 32]
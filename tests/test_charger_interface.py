@@ -1,3 +1,5 @@
+import datetime
+
 import pytest
 
 from tests.utils import load_fixture
@@ -648,8 +650,772 @@ def test_checksum():
         assert openevsewifi.parse_checksum(s) == s
 
 
+def reference_parse_checksum(s):
+    """The original rsplit implementation of parse_checksum, kept to check the current one against."""
+    import openevsewifi
+    spl = s.rsplit('^', 1)
+    if len(spl) == 1:
+        return s
+    try:
+        check = int(spl[1], 16)
+    except ValueError:
+        raise openevsewifi.BadChecksum(s)
+    datsum = 0
+    for c in spl[0].encode('utf-8'):
+        datsum ^= c
+    if datsum != check:
+        raise openevsewifi.BadChecksum(s)
+    return spl[0]
+
+
+REALISTIC_RETS = ["$OK 1 0^21", "$OK 2 3^21", "$OK 30 0001^22", "$OK 6 80^1E", "$OK 580 570 -2560^23",
+                  "$OK 0 2 19 1 40 47^1C", "$OK 0 136425^17", "$OK 5.0.1 4.0.1^21", "$NK^21", "$OK 10340 -1^0A"]
+
+
+@pytest.mark.parametrize('s', REALISTIC_RETS + ["$OK 1 0^22", "$OK^zz", "$OK 1 0", "a^b^5E", "^", "$OK ü^A2"])
+def test_checksum_matches_reference(s):
+    import openevsewifi
+    try:
+        expected = reference_parse_checksum(s)
+    except openevsewifi.BadChecksum:
+        with pytest.raises(openevsewifi.BadChecksum):
+            openevsewifi.parse_checksum(s)
+    else:
+        assert openevsewifi.parse_checksum(s) == expected
+
+
+def test_checksum_realistic_responses():
+    import openevsewifi
+    assert [openevsewifi.parse_checksum(s) for s in REALISTIC_RETS] == [
+        "$OK 1 0", "$OK 2 3", "$OK 30 0001", "$OK 6 80", "$OK 580 570 -2560", "$OK 0 2 19 1 40 47", "$OK 0 136425",
+        "$OK 5.0.1 4.0.1", "$NK", "$OK 10340 -1"]
+
+
 def test_auth_failure_raises_exception(test_charger_json, requests_mock):
     from openevsewifi import InvalidAuthentication
     requests_mock.post(test_charger_json._url, status_code=401)
     with pytest.raises(InvalidAuthentication):
         test_charger_json.protocol_version
+
+
+def test_session_reused_between_commands(test_charger_json, requests_mock):
+    requests_mock.post(test_charger_json._url, text=load_fixture('v3_responses/version.txt'))
+    session = test_charger_json._session
+    test_charger_json.firmware_version
+    test_charger_json.protocol_version
+    assert test_charger_json._session is session
+    assert requests_mock.call_count == 2
+
+
+def test_credentials_sent_with_session(requests_mock):
+    import openevsewifi
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, username='user', password='secret')
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    charger.firmware_version
+    assert requests_mock.last_request.headers['Authorization'].startswith('Basic ')
+
+
+def test_keep_alive_disabled(requests_mock):
+    import openevsewifi
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, keep_alive=False)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    charger.firmware_version
+    assert requests_mock.last_request.headers['Connection'] == 'close'
+
+
+def test_context_manager_closes_session():
+    import openevsewifi
+    from unittest import mock
+    charger = openevsewifi.Charger('openevse.example.tld')
+    with mock.patch.object(charger._session, 'close') as close:
+        with charger:
+            pass
+    close.assert_called_once_with()
+
+
+V1_FIXTURES = {
+    '$GS': 'v1_responses/status_charging.txt',
+    '$G3': 'v1_responses/time_limit_set.txt',
+    '$GA': 'v1_responses/ammeter.txt',
+    '$GC': 'v1_responses/capacity_range.txt',
+    '$GE': 'v1_responses/settings.txt',
+    '$GF': 'v1_responses/faults.txt',
+    '$GG': 'v1_responses/charging_values_charging.txt',
+    '$GH': 'v1_responses/charge_limit.txt',
+    '$GM': 'v1_responses/voltmeter_settings.txt',
+    '$GO': 'v1_responses/temperature_settings.txt',
+    '$GP': 'v1_responses/temperature_values.txt',
+    '$GT': 'v1_responses/time.txt',
+    '$GU': 'v1_responses/usage_charging.txt',
+    '$GV': 'v1_responses/version.txt',
+}
+
+
+def test_snapshot_sends_each_command_once(test_charger, requests_mock):
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger._url, text=rapi_responder(V1_FIXTURES))
+    snapshot = test_charger.snapshot()
+    assert requests_mock.call_count == len(V1_FIXTURES)
+    assert snapshot.status == 'charging'
+    assert snapshot.charge_time_elapsed == 568
+    assert snapshot.current_capacity == 50
+    assert snapshot.service_level == 2
+    assert snapshot.lcd_type == 'rgb'
+    assert snapshot.no_gnd_trip_count == 9
+    assert snapshot.charging_current == 10.34
+    assert snapshot.volt_meter_scale_factor == 0
+    assert snapshot.firmware_version == '3.11.3'
+
+
+def test_snapshot_matches_properties(test_charger, requests_mock):
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger._url, text=rapi_responder(V1_FIXTURES))
+    snapshot = test_charger.snapshot()
+    for name in snapshot._fields:
+        assert getattr(snapshot, name) == getattr(test_charger, name)
+
+
+def test_snapshot_is_immutable(test_charger, requests_mock):
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger._url, text=rapi_responder(V1_FIXTURES))
+    snapshot = test_charger.snapshot()
+    with pytest.raises(AttributeError):
+        snapshot.status = 'disabled'
+
+
+def test_cache_reuses_fresh_responses(requests_mock, clock):
+    import openevsewifi
+    cache = openevsewifi.ResponseCache(clock=clock)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, cache=cache)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    assert charger.firmware_version == '5.0.1'
+    assert charger.protocol_version == '4.0.1'
+    assert requests_mock.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    clock.now += cache.ttls['$GV']
+    charger.firmware_version
+    assert requests_mock.call_count == 2
+
+
+def test_cache_invalidate(requests_mock):
+    import openevsewifi
+    cache = openevsewifi.ResponseCache()
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, cache=cache)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    charger.firmware_version
+    cache.invalidate('$GV')
+    charger.firmware_version
+    cache.invalidate()
+    charger.firmware_version
+    assert requests_mock.call_count == 3
+
+
+def test_cache_shared_between_chargers(requests_mock):
+    import openevsewifi
+    cache = openevsewifi.ResponseCache()
+    first = openevsewifi.Charger('first.example.tld', json=True, cache=cache)
+    second = openevsewifi.Charger('second.example.tld', json=True, cache=cache)
+    requests_mock.post(first._url, text=load_fixture('v3_responses/capacity_range.txt'))
+    requests_mock.post(second._url, text='{"cmd":"$GC","ret":"$OK 10 40^25"}')
+    assert (first.max_amps, second.max_amps) == (80, 40)
+    assert (first.max_amps, second.max_amps) == (80, 40)
+    assert requests_mock.call_count == 2
+    cache.invalidate('$GC', 'first.example.tld')
+    assert (first.max_amps, second.max_amps) == (80, 40)
+    assert requests_mock.call_count == 3
+
+
+def test_cache_skips_commands_without_ttl(requests_mock):
+    import openevsewifi
+    cache = openevsewifi.ResponseCache(ttls={'$GS': 0})
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, cache=cache)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/status_connected.txt'))
+    charger.status
+    charger.status
+    assert requests_mock.call_count == 2
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_cache_evicts_least_recently_used():
+    import openevsewifi
+    cache = openevsewifi.ResponseCache(max_size=2)
+    cache.put('$GV', openevsewifi.VersionRecord('5.0.1', '4.0.1'))
+    cache.put('$GC', openevsewifi.CapacityRangeRecord(6, 80))
+    cache.get('$GV')
+    cache.put('$GA', openevsewifi.AmmeterRecord(220, 0))
+    assert cache.get('$GC') is None
+    assert cache.get('$GV') == ('5.0.1', '4.0.1')
+    assert cache.get('$GA') == (220, 0)
+
+
+def test_timeout_passed_to_request(requests_mock):
+    import openevsewifi
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, timeout=(1, 2))
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    charger.firmware_version
+    assert requests_mock.last_request.timeout == (1, 2)
+
+
+def test_transient_failures_are_retried(requests_mock, monkeypatch):
+    import openevsewifi
+    sleeps = []
+    monkeypatch.setattr(openevsewifi.time, 'sleep', sleeps.append)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, retries=3, backoff=1)
+    requests_mock.post(charger._url, [{'status_code': 503},
+                                      {'text': '{"cmd":"$GV","ret":"$OK 5.0.1 4.0.1^00"}'},
+                                      {'text': load_fixture('v3_responses/version.txt')}])
+    assert charger.firmware_version == '5.0.1'
+    assert requests_mock.call_count == 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+
+
+def test_retries_exhausted(requests_mock, monkeypatch):
+    import openevsewifi
+    monkeypatch.setattr(openevsewifi.time, 'sleep', lambda seconds: None)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, retries=2)
+    requests_mock.post(charger._url, exc=openevsewifi.requests.ConnectTimeout)
+    with pytest.raises(openevsewifi.requests.Timeout):
+        charger.firmware_version
+    assert requests_mock.call_count == 3
+
+
+def test_authentication_failure_not_retried(requests_mock):
+    import openevsewifi
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, retries=2)
+    requests_mock.post(charger._url, status_code=401)
+    with pytest.raises(openevsewifi.InvalidAuthentication):
+        charger.firmware_version
+    assert requests_mock.call_count == 1
+
+
+def test_circuit_breaker_fails_fast(requests_mock, clock):
+    import openevsewifi
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, breaker=breaker)
+    requests_mock.post(charger._url, exc=openevsewifi.requests.ConnectionError)
+    for _ in range(2):
+        with pytest.raises(openevsewifi.requests.ConnectionError):
+            charger.status
+    assert breaker.state == 'open'
+    with pytest.raises(openevsewifi.ChargerOffline):
+        charger.status
+    assert requests_mock.call_count == 2
+
+    clock.now += 30
+    assert breaker.state == 'half-open'
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/status_connected.txt'))
+    assert charger.status == 'connected'
+    assert breaker.state == 'closed'
+
+
+def test_circuit_breaker_reopens_after_failed_trial(requests_mock, clock):
+    import openevsewifi
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, breaker=breaker)
+    requests_mock.post(charger._url, status_code=500)
+    with pytest.raises(openevsewifi.ServerError):
+        charger.status
+    clock.now += 30
+    with pytest.raises(openevsewifi.ServerError):
+        charger.status
+    assert breaker.state == 'open'
+
+
+def test_circuit_breaker_lets_one_trial_through(requests_mock, clock):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    import openevsewifi
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, breaker=breaker)
+    breaker.record_failure()
+    clock.now += 30
+    started = threading.Event()
+    release = threading.Event()
+
+    def respond(request, context):
+        started.set()
+        release.wait(5)
+        return load_fixture('v3_responses/status_connected.txt')
+    requests_mock.post(charger._url, text=respond)
+    with ThreadPoolExecutor(1) as executor:
+        trial = executor.submit(lambda: charger.status)
+        assert started.wait(5)
+        with pytest.raises(openevsewifi.ChargerOffline):
+            charger.status
+        release.set()
+        assert trial.result() == 'connected'
+    assert breaker.state == 'closed'
+    assert requests_mock.call_count == 1
+
+
+def test_circuit_breaker_gives_up_abandoned_trial(clock):
+    import openevsewifi
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_request()
+    with pytest.raises(openevsewifi.ChargerOffline):
+        breaker.before_request()
+    clock.now += 30
+    breaker.before_request()
+
+
+@pytest.mark.parametrize('fixture, expected',
+                         [('v2_responses/status_unplugged.txt', 'not connected'),
+                          ('v2_responses/status_charging.txt', 'charging')])
+def test_get_status_v2(test_charger, requests_mock, fixture, expected):
+    requests_mock.post(test_charger._url, text=load_fixture(fixture))
+    assert test_charger.status == expected
+
+
+def test_get_firmware_version_v2(test_charger, requests_mock):
+    requests_mock.post(test_charger._url, text=load_fixture('v2_responses/version.txt'))
+    assert test_charger.firmware_version == '4.1.2'
+
+
+def test_xml_parser_checks_checksum():
+    import openevsewifi
+    assert openevsewifi.xml_parser(load_fixture('v2_responses/settings.txt')) == ['OK', '32', '0221']
+    with pytest.raises(openevsewifi.BadChecksum):
+        openevsewifi.xml_parser(load_fixture('v2_responses/bad_checksum.txt'))
+
+
+def test_xml_parser_without_response():
+    import openevsewifi
+    with pytest.raises(openevsewifi.BadResponse):
+        openevsewifi.xml_parser('<html><p>RAPI Command Sent</html>')
+
+
+def test_html_flavour_remembered(test_charger, requests_mock):
+    import openevsewifi
+    requests_mock.post(test_charger._url, text=load_fixture('v1_responses/status_charging.txt'))
+    test_charger.status
+    assert test_charger._parseResult._pattern is openevsewifi._xml_patterns[1]
+    requests_mock.post(test_charger._url, text=load_fixture('v2_responses/status_unplugged.txt'))
+    assert test_charger.status == 'not connected'
+    assert test_charger._parseResult._pattern is openevsewifi._xml_patterns[0]
+
+
+@pytest.mark.parametrize('record, response, expected',
+                         [('StatusRecord', 'OK 3 568', (3, 568)),
+                          ('TimeLimitRecord', 'OK 42', (630,)),
+                          ('SettingsRecord', 'OK 50 0221', (50, 0x221)),
+                          ('ChargingRecord', 'OK 10340 -1', (10.34, -0.001)),
+                          ('VoltMeterRecord', 'NK', (0, 0)),
+                          ('ThresholdsRecord', 'OK 650 400', (65.0, 40.0)),
+                          ('ClockRecord', 'OK 165 165 165 165 165 85', (None,)),
+                          ('UsageRecord', 'OK 7200 12419994', (2.0, 12419994.0)),
+                          ('VersionRecord', 'OK 5.0.1 4.0.1', ('5.0.1', '4.0.1'))])
+def test_decode_records(record, response, expected):
+    import openevsewifi
+    decoded = getattr(openevsewifi, record).decode(response.split())
+    assert decoded == expected
+    assert not hasattr(decoded, '__dict__')
+
+
+def test_snapshot_decodes_each_response_once(test_charger, requests_mock, monkeypatch):
+    import openevsewifi
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger._url, text=rapi_responder(V1_FIXTURES))
+    decoded = []
+    original = openevsewifi.SettingsRecord.decode.__func__
+
+    def counting_decode(cls, response):
+        decoded.append(response)
+        return original(cls, response)
+    monkeypatch.setattr(openevsewifi.SettingsRecord, 'decode', classmethod(counting_decode))
+    test_charger.snapshot()
+    assert decoded == [['OK', '50', '0221']]
+
+
+def test_batch_returns_results_in_order(test_charger_json, requests_mock):
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger_json._url, text=rapi_responder({
+        '$GS': 'v3_responses/status_connected.txt',
+        '$GV': 'v3_responses/version.txt',
+        '$GE': 'v3_responses/settings.txt',
+    }))
+    session = test_charger_json._session
+    results = test_charger_json.batch(['$GV', '$GS', '$GE'])
+    assert [result.command for result in results] == ['$GV', '$GS', '$GE']
+    assert [result.response for result in results] == [['OK', '5.0.1', '4.0.1'], ['OK', '2', '3'],
+                                                       ['OK', '30', '0001']]
+    assert all(result.error is None for result in results)
+    assert test_charger_json._session is session
+
+
+def test_batch_isolates_errors(test_charger_json, requests_mock):
+    import openevsewifi
+    requests_mock.post(test_charger_json._url, [{'text': '{"cmd":"$GS","ret":"$OK 2 3^00"}'},
+                                                {'text': load_fixture('v3_responses/version.txt')}])
+    bad, good = test_charger_json.batch(['$GS', '$GV'])
+    assert isinstance(bad.error, openevsewifi.BadChecksum)
+    assert bad.response is None
+    assert good.response == ['OK', '5.0.1', '4.0.1']
+
+
+def test_telemetry_adapts_interval_to_state(test_charger, requests_mock, monkeypatch):
+    import itertools
+    import openevsewifi
+    from tests.utils import rapi_responder
+    fixtures = {
+        '$GS': 'v1_responses/status_charging.txt',
+        '$GG': 'v1_responses/charging_values_charging.txt',
+        '$GU': 'v1_responses/usage_charging.txt',
+        '$GP': 'v1_responses/temperature_values.txt',
+    }
+    requests_mock.post(test_charger._url, text=rapi_responder(fixtures))
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(round(seconds))
+        fixtures['$GS'] = 'v1_responses/status_unplugged.txt'
+    monkeypatch.setattr(openevsewifi.time, 'sleep', sleep)
+    samples = list(itertools.islice(test_charger.telemetry(charging_interval=1, interval=5, idle_interval=60), 3))
+    assert [sample.status for sample in samples] == ['charging', 'not connected', 'not connected']
+    assert sleeps == [1, 60]
+    assert samples[0].charging_current == 10.34
+    assert samples[0].usage_total == 12419994.0
+    assert samples[0].rtc_temperature == 59.2
+    assert requests_mock.call_count == 12
+
+
+@pytest.mark.parametrize('call, command',
+                         [(lambda charger: charger.set_current_capacity(16), '$SC 16'),
+                          (lambda charger: charger.enable(), '$FE'),
+                          (lambda charger: charger.disable(), '$FD'),
+                          (lambda charger: charger.sleep(), '$FS'),
+                          (lambda charger: charger.set_time_limit(100), '$S3 7'),
+                          (lambda charger: charger.set_time_limit(1), '$S3 1'),
+                          (lambda charger: charger.set_time_limit(14), '$S3 1'),
+                          (lambda charger: charger.set_time_limit(15), '$S3 1'),
+                          (lambda charger: charger.set_time_limit(0), '$S3 0'),
+                          (lambda charger: charger.set_charge_limit(20), '$SH 20'),
+                          (lambda charger: charger.set_time(datetime.datetime(2020, 1, 20, 8, 34, 29)),
+                           '$S1 20 1 20 8 34 29')])
+def test_setters(test_charger_json, requests_mock, call, command):
+    from urllib.parse import parse_qs
+    requests_mock.post(test_charger_json._url, text='{"cmd":"","ret":"$OK^20"}')
+    call(test_charger_json)
+    assert parse_qs(requests_mock.last_request.text)['rapi'] == [command]
+
+
+def test_setter_rejected(test_charger_json, requests_mock):
+    import openevsewifi
+    requests_mock.post(test_charger_json._url, text='{"cmd":"$SC 99","ret":"$NK^21"}')
+    with pytest.raises(openevsewifi.CommandRejected):
+        test_charger_json.set_current_capacity(99)
+
+
+def test_setter_invalidates_cache(requests_mock):
+    import openevsewifi
+    cache = openevsewifi.ResponseCache()
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, cache=cache)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/settings.txt'))
+    charger.current_capacity
+    requests_mock.post(charger._url, text='{"cmd":"$SC 16","ret":"$OK^20"}')
+    charger.set_current_capacity(16)
+    assert cache.get('$GE') is None
+
+
+def test_batch_setter_invalidates_cache(requests_mock):
+    import openevsewifi
+    cache = openevsewifi.ResponseCache()
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, cache=cache)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/settings.txt'))
+    assert charger.current_capacity == 30
+    requests_mock.post(charger._url, text='{"cmd":"$SC 16","ret":"$OK^20"}')
+    [result] = charger.batch(['$SC 16'])
+    assert result.error is None
+    assert cache.get('$GE', 'openevse.example.tld') is None
+
+
+def test_deferred_setters_coalesce(test_charger_json, requests_mock):
+    from urllib.parse import parse_qs
+    requests_mock.post(test_charger_json._url, text='{"cmd":"","ret":"$OK^20"}')
+    test_charger_json.set_current_capacity(10, defer=True)
+    test_charger_json.sleep(defer=True)
+    test_charger_json.set_current_capacity(12, defer=True)
+    test_charger_json.set_current_capacity(16, defer=True)
+    test_charger_json.enable(defer=True)
+    assert requests_mock.call_count == 0
+    results = test_charger_json.flush()
+    sent = [parse_qs(request.text)['rapi'][0] for request in requests_mock.request_history]
+    assert sent == ['$SC 16', '$FE']
+    assert [(result.command, result.error) for result in results] == [('$SC 16', None), ('$FE', None)]
+    assert test_charger_json.flush() == []
+
+
+def test_flush_reports_rejected_commands(test_charger_json, requests_mock):
+    import openevsewifi
+    requests_mock.post(test_charger_json._url, text='{"cmd":"$SC 99","ret":"$NK^21"}')
+    test_charger_json.set_current_capacity(99, defer=True)
+    [result] = test_charger_json.flush()
+    assert isinstance(result.error, openevsewifi.CommandRejected)
+
+
+@pytest.fixture
+def transports(monkeypatch):
+    import openevsewifi
+    registry = openevsewifi.TransportRegistry()
+    monkeypatch.setattr(openevsewifi, 'shared_transports', registry)
+    yield registry
+    registry.close()
+
+
+def test_shared_transport_reuses_session_and_resolution(transports, requests_mock, monkeypatch):
+    import socket
+    import openevsewifi
+    lookups = []
+
+    def getaddrinfo(host, port, *args):
+        lookups.append((host, port))
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.7', port))]
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    requests_mock.post('http://192.0.2.7/r?json=1&', text=load_fixture('v3_responses/version.txt'))
+    first = openevsewifi.Charger('openevse.example.tld', json=True, shared_transport=True)
+    second = openevsewifi.Charger('openevse.example.tld', json=True, shared_transport=True)
+    assert first._session is second._session
+    first.firmware_version
+    second.firmware_version
+    assert lookups == [('openevse.example.tld', 80)]
+    assert requests_mock.call_count == 2
+    assert requests_mock.last_request.headers['Host'] == 'openevse.example.tld'
+
+
+def test_shared_transport_connection_limit(transports):
+    import openevsewifi
+    transports.limit('openevse.example.tld', 3)
+    charger = openevsewifi.Charger('openevse.example.tld', shared_transport=True)
+    adapter = charger._session.get_adapter('http://openevse.example.tld/')
+    assert adapter._pool_maxsize == 3
+    assert adapter._pool_block
+    assert openevsewifi.Charger('other.example.tld', shared_transport=True)._session is not charger._session
+
+
+def test_shared_transport_survives_close(transports):
+    import openevsewifi
+    from unittest import mock
+    charger = openevsewifi.Charger('openevse.example.tld', shared_transport=True)
+    with mock.patch.object(charger._session, 'close') as close:
+        charger.close()
+    close.assert_not_called()
+
+
+def test_request_limiter_bounds_requests_in_flight():
+    import threading
+    import time
+    import openevsewifi
+    limiter = openevsewifi.RequestLimiter(max_in_flight=2)
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def request():
+        with limiter:
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+
+
+def test_request_limiter_rate():
+    import time
+    import openevsewifi
+    limiter = openevsewifi.RequestLimiter(max_in_flight=10, rate=50, burst=2)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    # Two requests go straight away and the other three wait 1/50 s each for a token.
+    assert 0.05 <= time.monotonic() - started < 0.5
+
+
+def test_charger_waits_for_limiter(requests_mock):
+    import openevsewifi
+    from unittest import mock
+    limiter = openevsewifi.RequestLimiter()
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, limiter=limiter)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    with mock.patch.object(limiter, 'acquire', wraps=limiter.acquire) as acquire:
+        charger.firmware_version
+    acquire.assert_called_once_with()
+    assert limiter._in_flight == 0
+
+
+def test_shared_transport_shares_limiter(transports):
+    import openevsewifi
+    transports.limit('openevse.example.tld', 2, rate=5)
+    charger = openevsewifi.Charger('openevse.example.tld', shared_transport=True)
+    assert charger._limiter is transports.limiter('openevse.example.tld')
+    assert (charger._limiter.max_in_flight, charger._limiter.rate) == (2, 5)
+
+
+def test_concurrent_snapshot():
+    import time
+    import openevsewifi
+    from openevsewifi.simulator import ChargerSimulator
+    with ChargerSimulator(latency=0.05) as simulator:
+        with openevsewifi.Charger(simulator.host, json=True, pool_size=4, workers=4) as charger:
+            started = time.monotonic()
+            snapshot = charger.snapshot()
+            elapsed = time.monotonic() - started
+    commands = len(set(command for _, command, _ in openevsewifi._snapshot_fields))
+    # Sequentially the snapshot would take at least commands * 0.05 seconds.
+    assert elapsed < commands * 0.05 / 2
+    assert snapshot.firmware_version == '5.1.2'
+    assert snapshot.max_amps == 80
+
+
+def test_read_properties(test_charger, requests_mock):
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger._url, text=rapi_responder(V1_FIXTURES))
+    values = test_charger.read(['status', 'charge_time_elapsed', 'firmware_version'])
+    assert values == {'status': 'charging', 'charge_time_elapsed': 568, 'firmware_version': '3.11.3'}
+    assert requests_mock.call_count == 2
+    with pytest.raises(ValueError):
+        test_charger.read(['voltage'])
+
+
+def test_charger_shared_between_threads(requests_mock):
+    from concurrent.futures import ThreadPoolExecutor
+    import openevsewifi
+    from tests.utils import rapi_responder
+    cache = openevsewifi.ResponseCache(ttls={'$GS': 60, '$GV': 60})
+    charger = openevsewifi.Charger('openevse.example.tld', cache=cache, breaker=openevsewifi.CircuitBreaker())
+    requests_mock.post(charger._url, text=rapi_responder(V1_FIXTURES))
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: (charger.status, charger.firmware_version), range(200)))
+    assert set(results) == {('charging', '3.11.3')}
+    assert cache.hits + cache.misses == 400
+
+
+def test_read_uses_status_pages(test_charger_json, requests_mock):
+    from urllib.parse import parse_qs
+    from tests.utils import rapi_responder
+    requests_mock.get('http://openevse.example.tld/status', text=load_fixture('v3_pages/status.txt'))
+    requests_mock.get('http://openevse.example.tld/config', text=load_fixture('v3_pages/config.txt'))
+    requests_mock.post(test_charger_json._url, text=rapi_responder({
+        '$GE': 'v3_responses/settings.txt',
+        '$GV': 'v3_responses/version.txt',
+    }))
+    values = test_charger_json.read(['status', 'charging_current', 'usage_session', 'usage_total', 'rtc_temperature',
+                                     'gfi_trip_count', 'protocol_version', 'max_amps', 'current_capacity'])
+    assert values == {'status': 'charging', 'charging_current': 27.83, 'usage_session': 3377.0,
+                      'usage_total': 136425.0, 'rtc_temperature': 28.5, 'gfi_trip_count': 1,
+                      'protocol_version': '4.0.1', 'max_amps': 32, 'current_capacity': 30}
+    rapi = [parse_qs(request.text)['rapi'][0] for request in requests_mock.request_history if request.method == 'POST']
+    assert sorted(rapi) == ['$GE', '$GV']
+
+
+def test_status_pages_fall_back_to_rapi(test_charger_json, requests_mock):
+    requests_mock.get('http://openevse.example.tld/status', status_code=404)
+    requests_mock.post(test_charger_json._url, text=load_fixture('v3_responses/status_connected.txt'))
+    assert test_charger_json.read(['status']) == {'status': 'connected'}
+    assert test_charger_json.read(['status']) == {'status': 'connected'}
+    assert [request.method for request in requests_mock.request_history] == ['GET', 'POST', 'POST']
+
+
+def test_status_page_errors_reported(requests_mock):
+    import openevsewifi
+    import requests
+
+    class ErrorRecorder(openevsewifi.Instrumentation):
+        def __init__(self):
+            self.errors = []
+
+        def on_error(self, host, command, error):
+            self.errors.append((command, type(error)))
+
+    recorder = ErrorRecorder()
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, instrumentation=recorder)
+    requests_mock.get('http://openevse.example.tld/status', exc=requests.exceptions.InvalidURL)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/status_connected.txt'))
+    assert charger.read(['status']) == {'status': 'connected'}
+    assert recorder.errors == [('/status', requests.exceptions.InvalidURL)]
+
+
+def test_status_pages_use_circuit_breaker(requests_mock, clock):
+    import openevsewifi
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, breaker=breaker)
+    requests_mock.get('http://openevse.example.tld/status', exc=openevsewifi.requests.ConnectTimeout)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/status_connected.txt'))
+    with pytest.raises(openevsewifi.ChargerOffline):
+        charger.read(['status'])
+    with pytest.raises(openevsewifi.ChargerOffline):
+        charger.read(['status'])
+    assert [request.method for request in requests_mock.request_history] == ['GET']
+
+    clock.now += 30
+    requests_mock.get('http://openevse.example.tld/status', text=load_fixture('v3_pages/status.txt'))
+    assert charger.read(['status']) == {'status': 'charging'}
+    assert breaker.state == 'closed'
+
+
+def test_status_pages_not_tried_on_html_firmware(test_charger, requests_mock):
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger._url, text=rapi_responder(V1_FIXTURES))
+    test_charger.snapshot()
+    assert set(request.method for request in requests_mock.request_history) == {'POST'}
+
+
+def test_probe(test_charger_json, requests_mock):
+    from tests.utils import rapi_responder
+    requests_mock.get('http://openevse.example.tld/status', status_code=404)
+    requests_mock.post(test_charger_json._url, text=rapi_responder({
+        '$GV': 'v3_responses/version.txt',
+        '$GM': 'v3_responses/voltmeter_settings.txt',
+        '$GO': 'v3_responses/temperature_settings.txt',
+    }))
+    capabilities = test_charger_json.probe()
+    assert capabilities == ('5.0.1', '4.0.1', 'json', False, frozenset(['$GM', '$GO']))
+    assert test_charger_json.probe() is capabilities
+    calls = requests_mock.call_count
+    assert test_charger_json.volt_meter_scale_factor == 0
+    assert test_charger_json.ambient_threshold == 0.0
+    assert requests_mock.call_count == calls
+
+
+def test_probe_detects_html_flavour(requests_mock):
+    import openevsewifi
+    from tests.utils import rapi_responder
+    charger = openevsewifi.Charger('openevse.example.tld', json=True)
+    # Old firmware ignores json=1 and answers every request with an HTML page.
+    requests_mock.post('http://openevse.example.tld/r', text=rapi_responder(V1_FIXTURES))
+    capabilities = charger.probe()
+    assert capabilities.flavour == 'html'
+    assert capabilities.firmware_version == '3.11.3'
+    assert charger._url == 'http://openevse.example.tld/r?'
+
+
+def test_probe_keeps_flavour_if_neither_works(requests_mock):
+    import openevsewifi
+    charger = openevsewifi.Charger('openevse.example.tld', json=True)
+    requests_mock.post('http://openevse.example.tld/r', text='Not Found')
+    with pytest.raises((openevsewifi.BadResponse, ValueError)):
+        charger.probe()
+    assert charger._url == 'http://openevse.example.tld/r?json=1&'
+    assert charger._parseResult is openevsewifi.json_parser
+    assert charger._bulk is None
+
+
+def test_unsupported_commands_skipped_in_snapshots(test_charger, requests_mock):
+    from urllib.parse import parse_qs
+    from tests.utils import rapi_responder
+    requests_mock.post(test_charger._url, text=rapi_responder(V1_FIXTURES))
+    first = test_charger.snapshot()
+    requests_mock.reset_mock()
+    second = test_charger.snapshot()
+    sent = [parse_qs(request.text)['rapi'][0] for request in requests_mock.request_history]
+    assert len(sent) == len(V1_FIXTURES) - 2
+    assert '$GM' not in sent and '$GO' not in sent
+    assert second == first
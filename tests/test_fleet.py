@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import pytest
+
+from tests.utils import rapi_app
+
+pytest.importorskip('aiohttp')
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from openevsewifi import InvalidAuthentication  # noqa: E402
+from openevsewifi.fleet import ChargerFleet  # noqa: E402
+
+FIXTURES = {
+    '$GS': 'v3_responses/status_connected.txt',
+    '$GE': 'v3_responses/settings.txt',
+    '$GV': 'v3_responses/version.txt',
+}
+
+
+def poll(apps, properties, **kwargs):
+    """Start a local server per application and poll them all as one fleet, returning results in completion order."""
+    async def main():
+        servers = [TestServer(app) for app in apps]
+        for server in servers:
+            await server.start_server()
+        try:
+            hosts = ['%s:%d' % (server.host, server.port) for server in servers]
+            async with ChargerFleet.from_hosts(hosts, json=True, **kwargs) as fleet:
+                return hosts, [result async for result in fleet.poll(properties)]
+        finally:
+            for server in servers:
+                await server.close()
+    return asyncio.run(main())
+
+
+def test_poll_all_hosts():
+    received = []
+    hosts, results = poll([rapi_app(FIXTURES, received=received) for _ in range(3)],
+                          ['status', 'current_capacity', 'service_level'])
+    assert sorted(result.host for result in results) == sorted(hosts)
+    for result in results:
+        assert result.error is None
+        assert result.values == {'status': 'connected', 'current_capacity': 30, 'service_level': 2}
+    assert sorted(received) == ['$GE', '$GE', '$GE', '$GS', '$GS', '$GS']
+
+
+def test_poll_every_property_by_default():
+    fixtures = dict(FIXTURES, **{
+        '$G3': 'v3_responses/time_limit_set.txt',
+        '$GA': 'v3_responses/ammeter.txt',
+        '$GC': 'v3_responses/capacity_range.txt',
+        '$GF': 'v3_responses/faults.txt',
+        '$GG': 'v3_responses/charging_values_charging.txt',
+        '$GH': 'v3_responses/charge_limit.txt',
+        '$GM': 'v3_responses/voltmeter_settings.txt',
+        '$GO': 'v3_responses/temperature_settings.txt',
+        '$GP': 'v3_responses/temperature_values.txt',
+        '$GT': 'v3_responses/time.txt',
+        '$GU': 'v3_responses/usage_plugged.txt',
+    })
+    _, [result] = poll([rapi_app(fixtures)], None)
+    assert result.values['firmware_version'] == '5.0.1'
+    assert result.values['charging_current'] == 10.34
+
+
+def test_failures_are_isolated():
+    hosts, results = poll([rapi_app(FIXTURES, delay=5), rapi_app(FIXTURES, status=401), rapi_app(FIXTURES)],
+                          ['status'], timeout=0.5)
+    by_host = {result.host: result for result in results}
+    assert isinstance(by_host[hosts[0]].error, asyncio.TimeoutError)
+    assert isinstance(by_host[hosts[1]].error, InvalidAuthentication)
+    assert by_host[hosts[2]].values == {'status': 'connected'}
+    assert results[-1].host == hosts[0]
+
+
+def test_concurrency_limit():
+    start = time.monotonic()
+    _, results = poll([rapi_app(FIXTURES, delay=0.1) for _ in range(6)], ['status'], concurrency=2)
+    assert len(results) == 6
+    assert time.monotonic() - start >= 0.3
@@ -0,0 +1,93 @@
+import pytest
+
+import openevsewifi
+from openevsewifi.metrics import Histogram, MetricsCollector
+from tests.utils import load_fixture
+
+
+@pytest.fixture
+def metrics():
+    return MetricsCollector(buckets=(0.1, 1))
+
+
+@pytest.fixture
+def charger(metrics):
+    return openevsewifi.Charger('openevse.example.tld', json=True, instrumentation=metrics)
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 2))
+    for value in (0.5, 1, 1.5, 3):
+        histogram.observe(value)
+    assert histogram.cumulative() == [('1', 2), ('2', 3), ('+Inf', 4)]
+    assert (histogram.count, histogram.sum) == (4, 6.0)
+
+
+def test_responses_counted(charger, metrics, requests_mock):
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    charger.firmware_version
+    charger.protocol_version
+    key = ('openevse.example.tld', '$GV')
+    assert metrics.requests[key] == 2
+    assert metrics.network_seconds[key].count == 2
+    assert metrics.parse_seconds[key].count == 2
+
+
+def test_errors_counted_by_type(charger, metrics, requests_mock):
+    requests_mock.post(charger._url, text='{"cmd":"$GS","ret":"$OK 2 3^00"}')
+    with pytest.raises(openevsewifi.BadChecksum):
+        charger.status
+    requests_mock.post(charger._url, status_code=401)
+    with pytest.raises(openevsewifi.InvalidAuthentication):
+        charger.status
+    requests_mock.post(charger._url, exc=openevsewifi.requests.ReadTimeout)
+    with pytest.raises(openevsewifi.requests.Timeout):
+        charger.status
+    assert dict(metrics.errors) == {
+        ('openevse.example.tld', '$GS', 'BadChecksum'): 1,
+        ('openevse.example.tld', '$GS', 'InvalidAuthentication'): 1,
+        ('openevse.example.tld', '$GS', 'ReadTimeout'): 1,
+    }
+    assert not metrics.requests
+
+
+def test_retries_and_open_breaker_reported(metrics, requests_mock, monkeypatch):
+    monkeypatch.setattr(openevsewifi.time, 'sleep', lambda seconds: None)
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=1)
+    charger = openevsewifi.Charger('openevse.example.tld', json=True, retries=1, breaker=breaker,
+                                   instrumentation=metrics)
+    requests_mock.post(charger._url, status_code=503)
+    with pytest.raises(openevsewifi.ServerError):
+        charger.status
+    with pytest.raises(openevsewifi.ChargerOffline):
+        charger.status
+    assert metrics.errors[('openevse.example.tld', '$GS', 'ServerError')] == 2
+    assert metrics.errors[('openevse.example.tld', '$GS', 'ChargerOffline')] == 1
+
+
+def test_command_arguments_not_reported(charger, metrics, requests_mock):
+    requests_mock.post(charger._url, text='{"cmd":"$SC 16","ret":"$OK^20"}')
+    charger._send_command('$SC 16')
+    assert list(metrics.requests) == [('openevse.example.tld', '$SC')]
+
+
+def test_prometheus_format(charger, metrics, requests_mock):
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    charger.firmware_version
+    requests_mock.post(charger._url, status_code=500)
+    with pytest.raises(openevsewifi.ServerError):
+        charger.firmware_version
+    lines = metrics.prometheus().splitlines()
+    assert '# TYPE openevse_rapi_requests_total counter' in lines
+    assert 'openevse_rapi_requests_total{command="$GV",host="openevse.example.tld"} 1' in lines
+    assert 'openevse_rapi_network_seconds_bucket{command="$GV",host="openevse.example.tld",le="+Inf"} 1' in lines
+    assert 'openevse_rapi_parse_seconds_count{command="$GV",host="openevse.example.tld"} 1' in lines
+    assert ('openevse_rapi_errors_total{command="$GV",error="ServerError",host="openevse.example.tld"} 1'
+            in lines)
+
+
+def test_disabled_by_default(requests_mock):
+    charger = openevsewifi.Charger('openevse.example.tld', json=True)
+    requests_mock.post(charger._url, text=load_fixture('v3_responses/version.txt'))
+    assert charger._instrumentation is None
+    assert charger.firmware_version == '5.0.1'
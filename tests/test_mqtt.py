@@ -0,0 +1,122 @@
+import pytest
+
+pytest.importorskip('paho.mqtt')
+
+import openevsewifi  # noqa: E402
+from openevsewifi.mqtt import MqttIngestor, NotPublished  # noqa: E402
+from tests.utils import MqttBroker, load_fixture  # noqa: E402
+
+STATUS = {'amp': '27830', 'voltage': '240', 'state': '3', 'elapsed': '1820', 'temp1': '285', 'temp2': '271',
+          'temp3': '0', 'wattsec': '12157200', 'watthour': '136425', 'gfcicount': '1', 'nogndcount': '0',
+          'stuckcount': '0', 'pilot': '32'}
+
+
+@pytest.fixture
+def broker():
+    with MqttBroker() as broker:
+        yield broker
+
+
+def publish_status(broker, charger, base_topic, values=STATUS):
+    """Publish values under base_topic and wait for charger to receive them all."""
+    updates = charger.push_state.updates
+    for name, value in values.items():
+        broker.publish(base_topic + '/' + name, value)
+    assert charger.push_state.wait(updates + len(values), 5)
+
+
+def connected(ingestor, broker):
+    import time
+    deadline = time.monotonic() + 5
+    while len(broker.subscriptions) < len(ingestor._chargers) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return len(broker.subscriptions) == len(ingestor._chargers)
+
+
+def test_many_chargers_over_one_connection(broker):
+    with MqttIngestor(port=broker.port) as ingestor:
+        garage = ingestor.add('openevse-1234')
+        street = ingestor.add('site/openevse-5678')
+        assert connected(ingestor, broker)
+        publish_status(broker, garage, 'openevse-1234')
+        publish_status(broker, street, 'site/openevse-5678', {'state': '1', 'elapsed': '0'})
+        assert garage.status == 'charging'
+        assert garage.charging_current == 27.83
+        assert garage.usage_session == 3377.0
+        assert garage.rtc_temperature == 28.5
+        assert garage.gfi_trip_count == 1
+        assert street.status == 'not connected'
+        assert len(set(connection for connection, _ in broker.subscriptions)) == 1
+
+
+def test_unpublished_properties(broker):
+    with MqttIngestor(port=broker.port) as ingestor:
+        charger = ingestor.add('openevse-1234')
+        assert connected(ingestor, broker)
+        publish_status(broker, charger, 'openevse-1234')
+        with pytest.raises(NotPublished):
+            charger.current_capacity
+        snapshot = charger.snapshot()
+    assert snapshot.status == 'charging'
+    assert snapshot.usage_total == 136425.0
+    assert snapshot.current_capacity is None
+    assert snapshot.firmware_version is None
+
+
+def test_fallback_charger(broker, requests_mock):
+    fallback = openevsewifi.Charger('openevse.example.tld', json=True)
+    requests_mock.post(fallback._url, text=load_fixture('v3_responses/settings.txt'))
+    with MqttIngestor(port=broker.port) as ingestor:
+        charger = ingestor.add('openevse-1234', fallback=fallback)
+        assert connected(ingestor, broker)
+        publish_status(broker, charger, 'openevse-1234')
+        assert charger.read(['status', 'current_capacity']) == {'status': 'charging', 'current_capacity': 30}
+    assert requests_mock.call_count == 1
+
+
+def test_values_unused_while_disconnected(broker):
+    ingestor = MqttIngestor(port=broker.port)
+    charger = ingestor.add('openevse-1234')
+    charger.push_state.update({'state': 3, 'elapsed': 0})
+    with pytest.raises(NotPublished):
+        charger.status
+
+
+def test_commands_sent_to_fallback(broker, requests_mock):
+    from urllib.parse import parse_qs
+    fallback = openevsewifi.Charger('openevse.example.tld', json=True)
+    requests_mock.post(fallback._url, text='{"cmd":"","ret":"$OK^20"}')
+    with MqttIngestor(port=broker.port) as ingestor:
+        charger = ingestor.add('openevse-1234', fallback=fallback)
+        charger.set_current_capacity(16)
+        charger.sleep(defer=True)
+        assert [result.error for result in charger.flush()] == [None]
+    assert [parse_qs(request.text)['rapi'][0] for request in requests_mock.request_history] == ['$SC 16', '$FS']
+
+
+def test_probe_asks_fallback(broker, requests_mock):
+    from tests.utils import rapi_responder
+    fallback = openevsewifi.Charger('openevse.example.tld', json=True, bulk=False)
+    requests_mock.post(fallback._url, text=rapi_responder({
+        '$GV': 'v3_responses/version.txt',
+        '$GM': 'v3_responses/voltmeter_settings.txt',
+        '$GO': 'v3_responses/temperature_settings.txt',
+    }))
+    with MqttIngestor(port=broker.port) as ingestor:
+        charger = ingestor.add('openevse-1234', fallback=fallback)
+        capabilities = charger.probe()
+    assert capabilities.flavour == 'json'
+    assert capabilities.firmware_version == '5.0.1'
+    assert fallback.probe() is capabilities
+
+
+def test_commands_without_fallback(broker):
+    with MqttIngestor(port=broker.port) as ingestor:
+        charger = ingestor.add('openevse-1234')
+        with pytest.raises(NotPublished):
+            charger.set_current_capacity(16)
+        with pytest.raises(NotPublished):
+            charger.probe()
+        charger.enable(defer=True)
+        [result] = charger.flush()
+        assert isinstance(result.error, NotPublished)
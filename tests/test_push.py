@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+import openevsewifi  # noqa: E402
+from openevsewifi.push import AsyncPushCharger, PushCharger, PushState  # noqa: E402
+from openevsewifi.simulator import ChargerSimulator, SimulatedCharger  # noqa: E402
+
+
+class CommandCounter(openevsewifi.Instrumentation):
+    def __init__(self):
+        self.commands = []
+
+    def on_response(self, host, command, network_seconds, parse_seconds):
+        self.commands.append(command)
+
+
+@pytest.fixture
+def simulator(clock):
+    with ChargerSimulator(SimulatedCharger(clock=clock), push_interval=0.02) as simulator:
+        yield simulator
+
+
+def test_properties_follow_pushed_values(simulator, clock):
+    counter = CommandCounter()
+    with PushCharger(simulator.host, json=True, instrumentation=counter) as charger:
+        assert charger.wait_for_update(5)
+        assert charger.status == 'not connected'
+        clock.now = 45
+        assert charger.wait_for_update(5)
+        assert charger.status == 'charging'
+        assert charger.charging_current == 32.0
+        assert charger.rtc_temperature == 25.0
+    assert counter.commands == []
+
+
+def test_unpushed_properties_are_polled(simulator):
+    counter = CommandCounter()
+    with PushCharger(simulator.host, json=True, instrumentation=counter) as charger:
+        assert charger.wait_for_update(5)
+        assert charger.current_capacity == 32
+        snapshot = charger.snapshot()
+    assert snapshot.status == 'not connected'
+    assert snapshot.max_amps == 80
+    assert '$GS' not in counter.commands
+    assert '$GE' in counter.commands
+
+
+def test_polls_without_websocket(clock):
+    with ChargerSimulator(SimulatedCharger(clock=clock), bulk_pages=False) as simulator:
+        with PushCharger(simulator.host, json=True, reconnect_interval=0.05) as charger:
+            assert not charger.wait_for_update(0.2)
+            assert charger.status == 'not connected'
+
+
+def test_push_state_ignored_while_disconnected():
+    state = PushState()
+    state.update({'state': 3, 'elapsed': 10})
+    assert state.record('$GS') is None
+    state.set_connected(True)
+    assert state.record('$GS') == openevsewifi.StatusRecord(3, 10)
+    assert state.record('$GE') is None
+
+
+def test_async_push_charger(simulator, clock):
+    async def main():
+        async with AsyncPushCharger(simulator.host, json=True) as charger:
+            assert await charger.wait_for_update(5)
+            assert await charger.status() == 'not connected'
+            clock.now = 45
+            assert await charger.wait_for_update(5)
+            assert await charger.status() == 'charging'
+            assert await charger.max_amps() == 80
+    asyncio.run(main())
+
+
+def test_async_wait_for_update_needs_connect(simulator):
+    async def main():
+        charger = AsyncPushCharger(simulator.host, json=True)
+        try:
+            with pytest.raises(RuntimeError):
+                await charger.wait_for_update(0.1)
+        finally:
+            await charger.close()
+    asyncio.run(main())
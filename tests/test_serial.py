@@ -0,0 +1,154 @@
+import sys
+
+import pytest
+
+pytest.importorskip('serial')
+if sys.platform == 'win32':
+    pytest.skip('pseudo-terminals need a POSIX system', allow_module_level=True)
+
+import openevsewifi  # noqa: E402
+from openevsewifi.serial import SerialCharger, SerialTimeout  # noqa: E402
+from openevsewifi.simulator import SerialSimulator, SimulatedCharger  # noqa: E402
+
+
+@pytest.fixture
+def simulator(clock):
+    with SerialSimulator(SimulatedCharger(clock=clock)) as simulator:
+        yield simulator
+
+
+def test_properties(simulator, clock):
+    with SerialCharger(simulator.port) as charger:
+        assert charger.status == 'not connected'
+        assert charger.firmware_version == '5.1.2'
+        clock.now = 45
+        assert charger.status == 'charging'
+        assert charger.charging_current == 32.0
+        assert charger.volt_meter_scale_factor == 0
+    assert simulator.received[0] == '$GS^30'
+
+
+def test_setters(simulator):
+    with SerialCharger(simulator.port) as charger:
+        charger.set_current_capacity(16)
+        assert charger.current_capacity == 16
+        with pytest.raises(openevsewifi.CommandRejected):
+            charger.set_current_capacity(99)
+
+
+def test_snapshot_is_pipelined(simulator):
+    with SerialCharger(simulator.port, pipeline_depth=4) as charger:
+        snapshot = charger.snapshot()
+        assert snapshot.max_amps == 80
+        assert snapshot.firmware_version == '5.1.2'
+        assert charger.probe().flavour == 'serial'
+        assert charger.probe().unsupported == frozenset(['$GM', '$GO'])
+
+
+def test_batch(simulator):
+    with SerialCharger(simulator.port, sequence_ids=True) as charger:
+        results = charger.batch(['$GC', '$ZZ', '$GV'])
+    assert [result.response for result in results] == [['OK', '6', '80'], ['NK'], ['OK', '5.1.2', '4.0.1']]
+    assert simulator.received[0] == '$GC :01^3B'
+
+
+def test_unsolicited_messages_skipped(simulator):
+    with SerialCharger(simulator.port) as charger:
+        simulator.notify('$ST 03')
+        simulator.notify('$WF 02')
+        assert charger.max_amps == 80
+
+
+def test_stale_answers_dropped_with_sequence_ids(simulator):
+    with SerialCharger(simulator.port, sequence_ids=True) as charger:
+        simulator.notify('$OK 1 0 :FE')
+        assert charger.max_amps == 80
+
+
+def test_timeout():
+    import os
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    try:
+        with SerialCharger(os.ttyname(slave), timeout=0.05) as charger:
+            with pytest.raises(SerialTimeout):
+                charger.status
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def test_bad_checksum_retried(simulator):
+    from unittest import mock
+    with SerialCharger(simulator.port, retries=1, backoff=0) as charger:
+        responses = iter([openevsewifi.BadChecksum('$OK 1 0^00'), None])
+        real = charger._read_response
+
+        def read_response(tag=None):
+            error = next(responses)
+            if error is not None:
+                real(tag)
+                raise error
+            return real(tag)
+        with mock.patch.object(charger, '_read_response', read_response):
+            assert charger.status == 'not connected'
+
+
+def test_batch_uses_circuit_breaker(simulator, clock):
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    with SerialCharger(simulator.port, breaker=breaker) as charger:
+        breaker.record_failure()
+        results = charger.batch(['$GC', '$GV'])
+        assert [type(result.error) for result in results] == [openevsewifi.ChargerOffline] * 2
+        with pytest.raises(openevsewifi.ChargerOffline):
+            charger.snapshot()
+        assert simulator.received == []
+        clock.now += 30
+        results = charger.batch(['$GC', '$GV'])
+    assert [result.response for result in results] == [['OK', '6', '80'], ['OK', '5.1.2', '4.0.1']]
+    assert breaker.state == 'closed'
+
+
+def test_batch_retries_failed_commands(simulator):
+    from unittest import mock
+    with SerialCharger(simulator.port, retries=1, backoff=0) as charger:
+        responses = iter([openevsewifi.BadChecksum('$OK 6 80^00')])
+        real = charger._read_response
+
+        def read_response(tag=None):
+            error = next(responses, None)
+            if error is not None:
+                real(tag)
+                raise error
+            return real(tag)
+        with mock.patch.object(charger, '_read_response', read_response):
+            results = charger.batch(['$GC', '$GV'])
+    assert [result.response for result in results] == [['OK', '6', '80'], ['OK', '5.1.2', '4.0.1']]
+    assert [line.split('^')[0] for line in simulator.received] == ['$GC', '$GV', '$GC']
+
+
+def test_late_answer_discarded(clock):
+    with SerialSimulator(SimulatedCharger(clock=clock), delays={'$GV': 0.3}) as simulator:
+        with SerialCharger(simulator.port, timeout=0.2, retries=0) as charger:
+            with pytest.raises(SerialTimeout):
+                charger.firmware_version
+            assert charger.max_amps == 80
+
+
+def test_batch_survives_port_errors(simulator, clock):
+    import serial
+    breaker = openevsewifi.CircuitBreaker(failure_threshold=5, reset_timeout=30, clock=clock)
+    with SerialCharger(simulator.port, breaker=breaker, retries=0) as charger:
+        charger._serial.close()
+        results = charger.batch(['$GC', '$GV'])
+    assert [isinstance(result.error, serial.SerialException) for result in results] == [True, True]
+    assert breaker.failures == 3
+
+
+def test_batch_setter_invalidates_cache(simulator):
+    cache = openevsewifi.ResponseCache()
+    with SerialCharger(simulator.port, cache=cache) as charger:
+        assert charger.current_capacity == 32
+        charger.batch(['$SC 16', '$GV'])
+        assert charger.current_capacity == 16
@@ -0,0 +1,130 @@
+import pytest
+
+import openevsewifi
+from openevsewifi.simulator import ChargerSimulator, SimulatedCharger, SimulatorFleet
+
+
+@pytest.fixture
+def simulator(clock):
+    with ChargerSimulator(SimulatedCharger(clock=clock)) as simulator:
+        yield simulator
+
+
+def test_state_cycle(clock):
+    charger = SimulatedCharger(cycle=((1, 10), (3, 20)), clock=clock)
+    assert charger.state == 1
+    clock.now = 15
+    assert charger.state == 3
+    clock.now = 31
+    assert charger.state == 1
+
+
+def test_energy_accumulates_while_charging(clock):
+    charger = SimulatedCharger(cycle=((3, 100),), current_capacity=10, voltage=200, clock=clock)
+    charger.respond('$GS')
+    clock.now = 36
+    assert charger.respond('$GU') == '$OK 72000 20'
+    assert charger.respond('$GS') == '$OK 3 36'
+    assert charger.respond('$GG') == '$OK 10000 200000'
+
+
+def test_unknown_command(clock):
+    assert SimulatedCharger(clock=clock).respond('$ZZ') == '$NK'
+
+
+@pytest.mark.parametrize('json', [True, False])
+def test_charger_reads_simulator(simulator, clock, json):
+    with openevsewifi.Charger(simulator.host, json=json) as charger:
+        assert charger.status == 'not connected'
+        assert charger.current_capacity == 32
+        assert charger.firmware_version == '5.1.2'
+        clock.now = 45
+        assert charger.status == 'charging'
+        assert charger.charging_current == 32.0
+        snapshot = charger.snapshot()
+    assert snapshot.max_amps == 80
+    assert snapshot.volt_meter_scale_factor == 0
+
+
+def test_authentication():
+    with ChargerSimulator(username='admin', password='secret') as simulator:
+        with pytest.raises(openevsewifi.InvalidAuthentication):
+            openevsewifi.Charger(simulator.host, json=True).status
+        charger = openevsewifi.Charger(simulator.host, json=True, username='admin', password='secret')
+        assert charger.status == 'not connected'
+
+
+def test_error_rate():
+    with ChargerSimulator(error_rate=1) as simulator:
+        with pytest.raises(openevsewifi.ServerError):
+            openevsewifi.Charger(simulator.host, json=True).status
+
+
+@pytest.mark.parametrize('json', [True, False])
+def test_corrupt_rate(json):
+    with ChargerSimulator(corrupt_rate=1) as simulator:
+        with pytest.raises(openevsewifi.BadChecksum):
+            openevsewifi.Charger(simulator.host, json=json).status
+
+
+def test_latency():
+    import time
+    with ChargerSimulator(latency=0.1) as simulator:
+        started = time.monotonic()
+        openevsewifi.Charger(simulator.host, json=True).status
+        assert time.monotonic() - started >= 0.1
+
+
+def test_fleet():
+    with SimulatorFleet(3) as fleet:
+        assert len(set(fleet.hosts)) == 3
+        for host in fleet.hosts:
+            assert openevsewifi.Charger(host, json=True).protocol_version == '4.0.1'
+
+
+def test_setters(simulator):
+    charger = openevsewifi.Charger(simulator.host, json=True)
+    charger.set_current_capacity(16)
+    assert charger.current_capacity == 16
+    with pytest.raises(openevsewifi.CommandRejected):
+        charger.set_current_capacity(200)
+    charger.sleep()
+    assert charger.status == 'sleeping'
+    charger.disable()
+    assert charger.status == 'disabled'
+    charger.enable()
+    assert charger.status == 'not connected'
+    charger.set_time_limit(30)
+    assert charger.time_limit == 30
+    charger.set_charge_limit(12)
+    assert charger.charge_limit == 12
+
+
+@pytest.mark.parametrize('bulk_pages', [True, False])
+def test_snapshot_with_and_without_status_pages(clock, bulk_pages):
+    with ChargerSimulator(SimulatedCharger(clock=clock), bulk_pages=bulk_pages) as simulator:
+        clock.now = 45
+        with openevsewifi.Charger(simulator.host, json=True) as charger:
+            snapshot = charger.snapshot()
+    assert charger._bulk is bulk_pages
+    assert snapshot.status == 'charging'
+    assert snapshot.charging_current == 32.0
+    assert snapshot.charging_voltage == 240.0
+    assert snapshot.rtc_temperature == 25.0
+    assert snapshot.firmware_version == '5.1.2'
+    assert (snapshot.min_amps, snapshot.max_amps) == (6, 80)
+    assert snapshot.current_capacity == 32
+
+
+@pytest.mark.parametrize('cycle', [((1, 1000),), ((3, 1000),)])
+def test_status_pages_match_rapi(clock, cycle):
+    from openevsewifi import _bulk_records
+    commands = [command for _, command, _, _ in _bulk_records]
+    with ChargerSimulator(SimulatedCharger(cycle=cycle, clock=clock)) as simulator:
+        with openevsewifi.Charger(simulator.host, json=True) as bulk, \
+                openevsewifi.Charger(simulator.host, json=True, bulk=False) as rapi:
+            rapi.status
+            clock.now = 36
+            pages = bulk._bulk_query(commands)
+            assert pages == {command: rapi._fetch(command) for command in commands}
+            assert bulk.snapshot() == rapi.snapshot()
@@ -0,0 +1,128 @@
+import queue
+import threading
+
+import pytest
+
+import openevsewifi
+from openevsewifi.watch import Change, ChargerWatcher
+from tests.utils import rapi_responder
+
+
+@pytest.fixture
+def fixtures():
+    return {
+        '$GS': 'v1_responses/status_unplugged.txt',
+        '$GF': 'v1_responses/faults.txt',
+        '$GG': 'v1_responses/charging_values_unplugged.txt',
+    }
+
+
+@pytest.fixture
+def watcher(test_charger, requests_mock, fixtures):
+    requests_mock.post(test_charger._url, text=rapi_responder(fixtures))
+    return ChargerWatcher(test_charger)
+
+
+def test_first_poll_reports_initial_values(watcher):
+    changes = []
+    watcher.subscribe('status', changes.append)
+    watcher.subscribe('no_gnd_trip_count', changes.append)
+    assert watcher.poll() == [Change('status', None, 'not connected'), Change('no_gnd_trip_count', None, 9)]
+    assert changes == [Change('status', None, 'not connected'), Change('no_gnd_trip_count', None, 9)]
+
+
+def test_only_changes_are_reported(watcher, fixtures):
+    changes = []
+    watcher.subscribe('status', changes.append)
+    watcher.subscribe('charge_time_elapsed', changes.append)
+    watcher.poll()
+    del changes[:]
+    assert watcher.poll() == []
+    fixtures['$GS'] = 'v1_responses/status_charging.txt'
+    watcher.poll()
+    assert changes == [Change('status', 'not connected', 'charging'), Change('charge_time_elapsed', 0, 568)]
+
+
+def test_each_command_sent_once_per_poll(watcher, requests_mock):
+    watcher.subscribe('status', lambda change: None)
+    watcher.subscribe('charge_time_elapsed', lambda change: None)
+    watcher.subscribe('gfi_trip_count', lambda change: None)
+    watcher.poll()
+    assert requests_mock.call_count == 2
+
+
+def test_deadband(watcher, fixtures, requests_mock, test_charger):
+    changes = []
+    watcher.subscribe('charging_current', changes.append, deadband=0.5)
+    currents = iter(['0 -1', '300 -1', '600 -1', '1200 -1'])
+    requests_mock.post(test_charger._url, text=lambda request, context: '>>$OK %s<p>' % next(currents))
+    for _ in range(4):
+        watcher.poll()
+    assert changes == [Change('charging_current', None, 0.0), Change('charging_current', 0.0, 0.6),
+                       Change('charging_current', 0.6, 1.2)]
+
+
+def test_queue_subscriber(watcher):
+    changes = queue.Queue()
+    watcher.subscribe('status', changes.put)
+    watcher.poll()
+    assert changes.get_nowait() == Change('status', None, 'not connected')
+
+
+def test_unsubscribe(watcher):
+    changes = []
+    watcher.subscribe('status', changes.append)
+    watcher.unsubscribe('status', changes.append)
+    watcher.poll()
+    assert changes == []
+
+
+def test_unknown_property(watcher):
+    with pytest.raises(ValueError):
+        watcher.subscribe('colour', print)
+
+
+def test_run_until_stopped(watcher):
+    stop = threading.Event()
+    changes = []
+
+    def record(change):
+        changes.append(change)
+        stop.set()
+    watcher.subscribe('status', record)
+    watcher.run(interval=0.01, stop=stop)
+    assert changes == [Change('status', None, 'not connected')]
+
+
+def test_errors_propagate(watcher, requests_mock, test_charger):
+    watcher.subscribe('status', print)
+    requests_mock.post(test_charger._url, status_code=401)
+    with pytest.raises(openevsewifi.InvalidAuthentication):
+        watcher.poll()
+
+
+def test_run_survives_transient_errors(watcher, requests_mock, test_charger, fixtures, caplog):
+    stop = threading.Event()
+    changes = []
+    responses = [{'status_code': 500}, {'text': rapi_responder(fixtures)}]
+    requests_mock.post(test_charger._url, responses)
+
+    def record(change):
+        changes.append(change)
+        stop.set()
+    watcher.subscribe('status', record)
+    watcher.run(interval=0.01, stop=stop)
+    assert changes == [Change('status', None, 'not connected')]
+    assert 'Polling openevse.example.tld failed' in caplog.text
+
+
+def test_failing_subscriber_does_not_stop_others(watcher, caplog):
+    changes = []
+
+    def fail(change):
+        raise RuntimeError('subscriber bug')
+    watcher.subscribe('status', fail)
+    watcher.subscribe('status', changes.append)
+    assert watcher.poll() == [Change('status', None, 'not connected')] * 2
+    assert changes == [Change('status', None, 'not connected')]
+    assert 'subscriber bug' in caplog.text
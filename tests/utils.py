@@ -6,3 +6,148 @@ def load_fixture(filename):
     path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
     with open(path, encoding="utf-8") as fptr:
         return fptr.read()
+
+
+def rapi_responder(fixtures):
+    """Build a requests_mock text callback answering each RAPI command with the given fixture."""
+    from urllib.parse import parse_qs
+
+    def respond(request, context):
+        command = parse_qs(request.text)['rapi'][0]
+        return load_fixture(fixtures[command])
+    return respond
+
+
+def rapi_app(fixtures, status=200, delay=0, received=None):
+    """Build an aiohttp application answering RAPI commands with the given fixtures.
+
+    Commands are appended to received, if given, and each reply is held back for delay seconds."""
+    import asyncio
+    from aiohttp import web
+
+    async def handler(request):
+        form = await request.post()
+        if received is not None:
+            received.append(form['rapi'])
+        await asyncio.sleep(delay)
+        if status != 200:
+            return web.Response(status=status)
+        return web.Response(text=load_fixture(fixtures[form['rapi']]))
+
+    app = web.Application()
+    app.router.add_post('/r', handler)
+    return app
+
+
+class MqttBroker:
+    """A minimal MQTT 3.1.1 broker on localhost, for tests: it accepts any client, supports QoS 0 subscriptions with
+    + and # wildcards, and lets the test publish messages with publish()."""
+
+    def __init__(self):
+        import socketserver
+        import threading
+
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker._serve(self.request)
+
+        self.subscriptions = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.1,), daemon=True)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            for connection, _ in self.subscriptions:
+                connection.close()
+
+    def publish(self, topic, payload):
+        """Sends payload to every client subscribed to a filter matching topic"""
+        topic = topic.encode('utf-8')
+        payload = payload.encode('utf-8') if isinstance(payload, str) else payload
+        body = len(topic).to_bytes(2, 'big') + topic + payload
+        with self._lock:
+            connections = set(connection for connection, pattern in self.subscriptions
+                              if _topic_matches(pattern, topic.decode('utf-8')))
+        for connection in connections:
+            connection.sendall(_mqtt_packet(0x30, body))
+
+    def _serve(self, connection):
+        try:
+            while True:
+                header = connection.recv(1)
+                if not header:
+                    break
+                length, shift = 0, 0
+                while True:
+                    byte = connection.recv(1)[0]
+                    length |= (byte & 0x7f) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = b''
+                while len(body) < length:
+                    chunk = connection.recv(length - len(body))
+                    if not chunk:
+                        return
+                    body += chunk
+                kind = header[0] >> 4
+                if kind == 1:
+                    connection.sendall(_mqtt_packet(0x20, b'\x00\x00'))
+                elif kind == 8:
+                    granted = b''
+                    position = 2
+                    while position < len(body):
+                        size = int.from_bytes(body[position:position + 2], 'big')
+                        pattern = body[position + 2:position + 2 + size].decode('utf-8')
+                        with self._lock:
+                            self.subscriptions.append((connection, pattern))
+                        granted += b'\x00'
+                        position += 3 + size
+                    connection.sendall(_mqtt_packet(0x90, body[:2] + granted))
+                elif kind == 12:
+                    connection.sendall(_mqtt_packet(0xd0, b''))
+                elif kind == 14:
+                    break
+        except (OSError, IndexError):
+            pass
+        finally:
+            with self._lock:
+                self.subscriptions = [(other, pattern) for other, pattern in self.subscriptions
+                                      if other is not connection]
+            connection.close()
+
+
+def _mqtt_packet(header, body):
+    length = len(body)
+    encoded = b''
+    while True:
+        byte = length & 0x7f
+        length >>= 7
+        encoded += bytes([byte | (0x80 if length else 0)])
+        if not length:
+            return bytes([header]) + encoded + body
+
+
+def _topic_matches(pattern, topic):
+    patterns = pattern.split('/')
+    topics = topic.split('/')
+    for i, level in enumerate(patterns):
+        if level == '#':
+            return True
+        if i >= len(topics) or (level != '+' and level != topics[i]):
+            return False
+    return len(patterns) == len(topics)